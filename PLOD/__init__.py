@@ -5,7 +5,15 @@
 # Version 0.1.7
     
 import internal
+import indexes
+import columnar
+import hooks
+import expressions
+import queries
+import copy
 import types as typemod
+from array import array
+from itertools import islice, izip
 # import bson
 
 class PLOD(object):
@@ -42,6 +50,19 @@ class PLOD(object):
         {age: 19, income: 29000, name: 'Bill', wigs: None     , zim: None         }
     ]
 
+    Methods that take a *key* accept a single dictionary key, a cascading
+    list of keys that reaches into subtending dictionaries, or that same list
+    written as a dotted string. For example:
+
+    >>> print PLOD(test).eq(["zim", "zam"], "99").returnString()
+    [
+        {age: 29, name: 'Jim', zim: {'zam': '99'}}
+    ]
+    >>> print PLOD(test).eq("zim.zam", "99").returnString()
+    [
+        {age: 29, name: 'Jim', zim: {'zam': '99'}}
+    ]
+
     PLOD is designed to be very forgiving and, as much as possible, very flexible.
     '''
 
@@ -56,7 +77,14 @@ class PLOD(object):
     NOT_EQUAL = 5
     NOTEQUAL = 5
 
-    def __init__(self, table):
+    MISSING = columnar.MISSING  # marks a missing key for fromColumns
+    OperationLog = hooks.OperationLog  # a hook that collects the operations run
+
+    _hooks = []
+    _hook_depth = 0
+    _slow_paths = None
+
+    def __init__(self, table, deferred=False, processes=None, processChunkSize=100000):
         '''Initialize PLOD with the list of dictionaries (table).
 
         While the 'table' must be a list, the entries in the table
@@ -67,6 +95,8 @@ class PLOD(object):
         * classes with a .__dict__ attribute
         * mongoEngine documents (a class for MongoDb handling)
         * other lists (index positions used as keys)
+        * namedtuples, and objects of classes with __slots__ (the fields
+          are the keys, and are read directly as attributes)
 
         Example of use:
 
@@ -85,22 +115,740 @@ class PLOD(object):
             {0: None , 1: None , age: None, name: 'Smith'}
         ]
 
+        A namedtuple or an object with __slots__ makes a compact entry:
+
+        >>> from collections import namedtuple
+        >>> Point = namedtuple("Point", ["x", "y"])
+        >>> class Tagged(object):
+        ...     __slots__ = ("x", "tag")
+        ...     def __init__(self, x, tag):
+        ...         self.x = x
+        ...         self.tag = tag
+        >>> test = [Point(3, 4), Point(1, 2), Tagged(2, "a")]
+        >>> print PLOD(test).sort("x").returnString()
+        [
+            {tag: None, x: 1, y:    2},
+            {tag: 'a' , x: 2, y: None},
+            {tag: None, x: 3, y:    4}
+        ]
+
+        If *deferred* is True, then the filter methods (eq, ne, gt, gte, lt,
+        lte, hasKey, missingKey and contains) do not run when called.
+        Instead, they are recorded as a query plan. The whole plan is then
+        run as one fused pass over the list when any other method, such as
+        sort or a "return" method, needs the result. A chain of five filters
+        thus reads the list once rather than five times.
+
+        >>> test = [
+        ...    {"name": "Jim",   "age": 18, "income": 93000, "wigs": [9, 12]  },
+        ...    {"name": "Larry", "age": 18,                  "wigs": [3, 2, 9]},
+        ...    {"name": "Joe",   "age": 20, "income": 15000, "wigs": [1, 2, 3]},
+        ...    {"name": "Bill",  "age": 19, "income": 29000                   },
+        ... ]
+        >>> my_plod = PLOD(test, deferred=True).lt("age", 20).hasKey("income").contains("wigs", 9)
+        >>> print my_plod.returnString()
+        [
+            {age: 18, income: 93000, name: 'Jim', wigs: [9, 12]}
+        ]
+        >>> print my_plod.returnIndexList()
+        [0]
+
+        The *table* need not be a list: any iterable, such as a generator, a
+        database cursor or a reader of JSON lines, may be given. The entries
+        are then streamed through the filters (as if *deferred* were True)
+        and only the entries that pass are kept, so a source far larger than
+        memory can be filtered down. The original index of an entry is its
+        place in the stream.
+
+        >>> rows = ({"id": i, "even": i % 2 == 0} for i in xrange(20))
+        >>> my_plod = PLOD(rows).eq("even", True).lt("id", 7)
+        >>> print my_plod.returnIndexList()
+        [0, 2, 4, 6]
+
+        If *processes* is set, the filters on a long list are split across a
+        pool of worker processes. It only pays off for lists of hundreds of
+        thousands of entries, so small lists still run in one process unless
+        *processChunkSize* is lowered.
+
+        >>> my_plod = PLOD(test, processes=2, processChunkSize=2).gte("age", 19).contains("wigs", 9, includeMissing=True)
+        >>> print my_plod.returnIndexList()
+        [3]
+
+        .. versionadded:: 0.1.8
+
         :param table:
-           The list of dictionaries to work on.
+           The list of dictionaries to work on. Any other iterable, such as a
+           generator or a database cursor, is also accepted; see above.
+        :param deferred:
+           Defaults to False. If True, filters are recorded and run together
+           when the result is first needed.
+        :param processes:
+           Defaults to None. If set to more than 1, the filters on a list
+           longer than processChunkSize are run in a pool of that many worker
+           processes, processChunkSize entries at a time. The result is the
+           same as running in one process. The workers are forked, so this
+           has no effect on Windows.
+        :param processChunkSize:
+           Defaults to 100000. The number of entries handed to a worker
+           process at a time.
             
         :returns:
             class
         '''
+        self.deferred = deferred
+        self.processes = processes
+        self.processChunkSize = processChunkSize
+        self._plan = []
+        self._indexes = {}
+        self._positions = None
+        self._columns = None
+        self._column_positions = None
+        self._rows = None
+        if not hasattr(table, "__len__"):
+            self._source = iter(table)
+            self.table = []
+            self.index_track = []
+            self._next_index = 0
+            return None
+        self._source = None
         self.table = table
-        self.index_track = []
-        for i in range(len(self.table)):
-            self.index_track.append(i)
+        self.index_track = None # the implicit range(len(table)) until needed
+        self._next_index = len(self.table)
+        return None
+
+    @property
+    def table(self):
+        '''The current list of entries. Reading it runs any deferred filters.'''
+        if self._plan or self._source is not None:
+            self._run_plan()
+        if self._columns is not None:
+            self._leave_columns()
+        if self._rows is not None:
+            self._leave_view()
+        return self._table
+
+    @table.setter
+    def table(self, table):
+        self._table = table
+        self._rows = None
+        self._columns = None
+        self._column_positions = None
+
+    @property
+    def index_track(self):
+        '''The original index of each entry in the current list, held as an
+        array of integers.'''
+        if self._index_track is None:
+            self._index_track = array('l', self._orig_indices())
+        return self._index_track
+
+    @index_track.setter
+    def index_track(self, index_track):
+        if not (index_track is None or type(index_track) is array):
+            index_track = array('l', index_track)
+        self._index_track = index_track
+        self._positions = None
+
+    def _orig_indices(self):
+        '''Return the original indices for reading only. Unlike index_track,
+        this does not build the array while it is still the implicit range.'''
+        if self._plan or self._source is not None:
+            self._run_plan()
+        if self._index_track is None:
+            if self._rows is not None:
+                return xrange(len(self._rows))
+            return xrange(len(self._table))
+        return self._index_track
+
+    def _known_count(self):
+        '''Return the number of entries in the current list, or None if it is
+        not known without running the deferred filters.'''
+        if self._plan or self._source is not None:
+            return None
+        if self._index_track is not None:
+            return len(self._index_track)
+        if self._rows is not None:
+            return len(self._rows)
+        return len(self._table)
+
+    def _enter_view(self):
+        '''Hold the current list as a view, if possible; return True if it is.
+
+        While index_track is still the implicit range, the original index of
+        each entry is also its position in the table. The table can then be
+        kept as it is (as _rows) and the filters, sorts and deletes need only
+        rearrange index_track, which doubles as the positions of the view.
+        '''
+        if self._rows is not None:
+            return True
+        if self._table is None or self._index_track is not None:
+            return False
+        self._rows = self._table
+        self._table = None
+        return True
+
+    def _leave_view(self):
+        '''Build the list of entries the view refers to.'''
+        rows = self._rows
+        positions = self._index_track
+        self._rows = None
+        if positions is None:
+            self._table = rows
+        else:
+            self._table = [rows[pos] for pos in positions]
+
+    def _position_map(self):
+        '''Return a dictionary of original index -> current position.'''
+        if self._positions is None:
+            self._positions = dict((orig, pos) for (pos, orig) in enumerate(self._orig_indices()))
+        return self._positions
+
+    def _iter_entries(self, limit=False):
+        '''Return an iterator of (original index, entry) over the current
+        list. A view is read in place rather than built into a new list.'''
+        if self._plan or self._source is not None:
+            self._run_plan()
+        if self._columns is not None:
+            self._leave_columns()
+        if self._rows is not None:
+            rows = self._rows
+            positions = self._index_track
+            if positions is None:
+                positions = xrange(len(rows))
+            entries = ((pos, rows[pos]) for pos in positions)
+        else:
+            entries = izip(self._orig_indices(), self._table)
+        if limit:
+            entries = islice(entries, max(limit, 0))
+        return entries
+
+    def _filter(self, *conditions):
+        '''Apply (or, if deferred, record) filter conditions. See
+        internal.compile_condition for the form of a condition.'''
+        self._plan.extend(conditions)
+        if not self.deferred and self._source is None:
+            self._run_plan()
+        return self
+
+    def _run_plan(self):
+        '''Run all of the recorded filter conditions in a single pass.
+
+        Conditions that an index can answer narrow the list by original index
+        first; the remaining conditions are then tested row by row.
+        '''
+        plan = self._plan
+        self._plan = []
+        if self._source is not None:
+            tests = [internal.compile_condition(condition) for condition in plan]
+            (table, index_track, self._next_index) = internal.filter_stream(self._source, tests)
+            self._source = None
+            self.table = table
+            self.index_track = index_track
+            return
+        if self._columns is not None:
+            plan = self._run_column_plan(plan)
+            if not plan:
+                return
+            self._leave_columns()
+        conditions = []
+        found = None
+        for condition in plan:
+            result = self._index_lookup(condition)
+            if result is None:
+                conditions.append(condition)
+            elif found is None:
+                found = result
+            else:
+                found &= result
+        if self._enter_view():
+            rows = self._rows
+            positions = self._index_track
+            if found is not None:
+                if positions is None:
+                    positions = sorted(found)
+                else:
+                    positions = [pos for pos in positions if pos in found]
+            elif positions is None:
+                positions = xrange(len(rows))
+            if conditions:
+                positions = self._filter_positions(rows, positions, conditions)
+            self.index_track = positions
+            return
+        table = self._table
+        index_track = self._index_track
+        if found is not None:
+            positions = self._position_map()
+            keep = sorted(positions[orig] for orig in found if orig in positions)
+            table = [table[pos] for pos in keep]
+            index_track = array('l', (index_track[pos] for pos in keep))
+        if conditions:
+            keep = self._filter_positions(table, xrange(len(table)), conditions)
+            table = [table[pos] for pos in keep]
+            index_track = array('l', (index_track[pos] for pos in keep))
+        self.table = table
+        self.index_track = index_track
+
+    def _filter_positions(self, rows, positions, conditions):
+        '''Return the positions whose rows pass every condition, using a pool
+        of worker processes if asked for and worthwhile.'''
+        if self.processes and self.processes>1 and len(positions)>self.processChunkSize:
+            result = internal.parallel_positions(rows, positions, conditions, self.processes, self.processChunkSize)
+            if result is not None:
+                return result
+        tests = [internal.compile_condition(condition) for condition in conditions]
+        return internal.filter_positions(rows, positions, tests)
+
+    ############################
+    # Hooks
+    ############################
+
+    def addHook(self, hook):
+        '''Report every following operation on this PLOD to a hook.
+
+        The hook is called after each operation (such as a filter, a sort or
+        a "return" method) with a dictionary describing it: the "operation"
+        name, its "args" and "kwargs", the number of entries before
+        ("rows_in") and after ("rows_out"), and the wall time taken in
+        "seconds". The counts are None while a deferred filter has not yet
+        run. Without any hooks, the operations are not timed at all.
+
+        PLOD.OperationLog is a hook that keeps the records and prints a
+        summary of them:
+
+        >>> test = [
+        ...    {"name": "Jim",   "age": 18, "income": 93000, "order": 2},
+        ...    {"name": "Larry", "age": 18,                  "order": 3},
+        ...    {"name": "Joe",   "age": 20, "income": 15000, "order": 1},
+        ...    {"name": "Bill",  "age": 19, "income": 29000, "order": 4},
+        ... ]
+        >>> log = PLOD.OperationLog()
+        >>> print PLOD(test).addHook(log).gt("age", 18).sort("name").returnIndexList()
+        [3, 2]
+        >>> print [(record["operation"], record["rows_in"], record["rows_out"]) for record in log.records]
+        [('gt', 4, 2), ('sort', 2, 2), ('returnIndexList', 2, 2)]
+        >>> print log.summary() # doctest: +ELLIPSIS
+        operation                                  rows in  rows out     seconds
+        gt('age', 18)                                    4         2    0.0...
+        sort('name')                                     2         2    0.0...
+        returnIndexList()                                2         2    0.0...
+        total                                                           0.0...
+
+        .. versionadded:: 0.1.8
+
+        :param hook:
+           A callable taking one parameter.
+        :returns: self
+        '''
+        self._hooks = self._hooks + [hook]
+        return self
+
+    def removeHook(self, hook):
+        '''Stop reporting to a hook added with addHook.
+
+        .. versionadded:: 0.1.8
+
+        :param hook:
+           The hook to remove.
+        :returns: self
+        '''
+        self._hooks = [one_hook for one_hook in self._hooks if one_hook is not hook]
+        return self
+
+    @staticmethod
+    def addGlobalHook(hook):
+        '''Report the operations of every PLOD to a hook; see addHook.
+
+        .. versionadded:: 0.1.8
+
+        :param hook:
+           A callable taking one parameter.
+        '''
+        hooks.global_hooks.append(hook)
+
+    @staticmethod
+    def removeGlobalHook(hook):
+        '''Stop reporting to a hook added with addGlobalHook.
+
+        .. versionadded:: 0.1.8
+
+        :param hook:
+           The hook to remove.
+        '''
+        hooks.global_hooks[:] = [one_hook for one_hook in hooks.global_hooks if one_hook is not hook]
+
+    @staticmethod
+    def registerRowType(rowClass, fields=None, properties=False):
+        '''Tell PLOD which attributes hold the data of the entries of a class.
+
+        An entry that is an object without a __dict__ is read by attribute.
+        When one is turned into a dictionary (by returnLOD, returnString or
+        returnCSV, for example) only its data attributes are copied: the
+        __slots__ of its class and of its bases, or the fields of a
+        namedtuple. This list is worked out once per class.
+
+        registerRowType gives the list for a class instead. With
+        *properties* set, the properties of the class are read as well;
+        they are otherwise ignored, since reading one may run any code. The
+        entries of a registered class (but not of its subclasses) are always
+        read by attribute.
+
+        Example of use:
+
+        >>> class Person(object):
+        ...     def __init__(self, first, last):
+        ...         self.first = first
+        ...         self.last = last
+        ...     @property
+        ...     def name(self):
+        ...         return self.first + " " + self.last
+        >>> test = [Person("Jim", "Smith"), Person("Ann", "Jones")]
+        >>> PLOD.registerRowType(Person, properties=True)
+        >>> print PLOD(test).eq("name", "Ann Jones").returnString()
+        [
+            {first: 'Ann', last: 'Jones', name: 'Ann Jones'}
+        ]
+
+        .. versionadded:: 0.1.8
+
+        :param rowClass:
+           The class of the entries.
+        :param fields:
+           The names of the attributes to read. Defaults to None, which finds
+           them from __slots__ or the namedtuple fields (and, for a class with
+           a __dict__, from the __dict__ of each entry).
+        :param properties:
+           If True, the properties of the class are read as well.
+        '''
+        internal.register_row_type(rowClass, fields, properties)
+
+    def trackSlowPaths(self):
+        '''Count the slow paths taken by the following operations on this PLOD.
+
+        Some kinds of entries and values force PLOD into fallbacks that cost
+        far more than the usual path:
+
+        * "getmembers": an object without a __dict__ had to be examined with
+          inspect.getmembers.
+        * "convert_copy": an entry that is not a dictionary (a list, a
+          dictionary-like object or a plain object) was copied into a new
+          dictionary.
+        * "str_compare": an eq or ne (or upsert) comparison of values of
+          different types fell back to comparing their str() values.
+
+        The counts show which sources of data should be fixed upstream. They
+        are read with returnSlowPaths; the counts for the whole process are
+        kept all of the time and read with PLOD.globalSlowPaths. Filters run
+        in worker processes (see the *processes* parameter) are not counted.
+
+        Example of use:
+
+        >>> test = [
+        ...    {"name": "Jim",   "age": 18},
+        ...    {"name": "Joe",   "age": "20"},
+        ...    ["Larry", 18],
+        ... ]
+        >>> my_plod = PLOD(test).trackSlowPaths().eq("age", 20)
+        >>> print sorted(my_plod.returnSlowPaths().items())
+        [('convert_copy', 0), ('getmembers', 0), ('str_compare', 1)]
+        >>> my_plod = PLOD(test).trackSlowPaths()
+        >>> lod = my_plod.returnLOD()
+        >>> print sorted(my_plod.returnSlowPaths().items())
+        [('convert_copy', 1), ('getmembers', 0), ('str_compare', 0)]
+
+        .. versionadded:: 0.1.8
+
+        :returns: self
+        '''
+        if self._slow_paths is None:
+            self._slow_paths = dict.fromkeys(internal.SLOW_PATHS, 0)
+        return self
+
+    def returnSlowPaths(self):
+        '''Return the counts of the slow paths taken since trackSlowPaths was
+        called, as a dictionary. Returns None if trackSlowPaths was not
+        called. See trackSlowPaths.
+
+        .. versionadded:: 0.1.8
+
+        :return:
+           A dictionary of slow path name -> count.
+        '''
+        if self._slow_paths is None:
+            return None
+        return dict(self._slow_paths)
+
+    @staticmethod
+    def globalSlowPaths(reset=False):
+        '''Return the counts of the slow paths taken by every PLOD in this
+        process. See trackSlowPaths.
+
+        .. versionadded:: 0.1.8
+
+        :param reset:
+           If True, the counts are set back to zero after being read.
+        :return:
+           A dictionary of slow path name -> count.
+        '''
+        result = dict(internal.slow_paths)
+        if reset:
+            for name in internal.SLOW_PATHS:
+                internal.slow_paths[name] = 0
+        return result
+
+    ############################
+    # Columns
+    ############################
+
+    @classmethod
+    def fromColumns(cls, columns, deferred=False):
+        '''Create a PLOD from a dictionary of columns rather than a list of rows.
+
+        Each key of 'columns' names a column and its value is the list of the
+        values in that column, one per entry; all the lists must be the same
+        length. Use PLOD.MISSING for an entry that does not have the key at all.
+
+        The columns are stored as typed arrays where possible. While the
+        columns are held, the eq, ne, gt, gte, lt, lte, hasKey and missingKey
+        filters on a simple key, sort, count, and returnIndexList work on the
+        columns directly. Any other method first turns the columns back into
+        a list of dictionaries, after which PLOD continues as normal.
+
+        Example of use:
+
+        >>> columns = {
+        ...    "name": ["Jim", "Larry", "Joe", "Bill"],
+        ...    "age": [18, 18, 20, 19],
+        ...    "income": [93000, PLOD.MISSING, 15000, 29000],
+        ... }
+        >>> my_plod = PLOD.fromColumns(columns).gt("income", 20000)
+        >>> print my_plod.returnIndexList()
+        [0, 3]
+        >>> print my_plod.sort("age").returnString()
+        [
+            {age: 18, income: 93000, name: 'Jim' },
+            {age: 19, income: 29000, name: 'Bill'}
+        ]
+
+        .. versionadded:: 0.1.8
+
+        :param columns:
+           A dictionary of key -> list of values.
+        :param deferred:
+           See the class constructor.
+        :returns:
+           a new PLOD
+        '''
+        store = columnar.ColumnStore.from_columns(columns)
+        result = cls([], deferred=deferred)
+        result._use_columns(store)
+        return result
+
+    @hooks.instrumented
+    def toColumnar(self):
+        '''Hold the current entries as columns (see fromColumns).
+
+        The top-level keys of the entries become the columns. The entries
+        themselves are kept, so the list methods still return the original
+        entries. This pays off when several filters or sorts are run on a
+        large list before the result is read.
+
+        Example of use:
+
+        >>> test = [
+        ...    {"name": "Jim",   "age": 18, "income": 93000},
+        ...    {"name": "Larry", "age": 18                 },
+        ...    {"name": "Joe",   "age": 20, "income": 15000},
+        ...    {"name": "Bill",  "age": 19, "income": 29000},
+        ... ]
+        >>> print PLOD(test).toColumnar().lt("income", 50000).sort("age").returnIndexList()
+        [3, 2]
+        >>> print PLOD(test).toColumnar().eq("age", 18).returnList() == test[0:2]
+        True
+
+        .. versionadded:: 0.1.8
+
+        :returns:
+           self
+        '''
+        store = columnar.ColumnStore.from_rows(self.table)
+        self._use_columns(store)
+        return self
+
+    def _use_columns(self, store):
+        '''Switch to holding the entries in a ColumnStore.'''
+        index_track = self.index_track
+        self._table = None
+        self._columns = store
+        self._column_positions = range(store.length)
+        if len(index_track)!=store.length:
+            self.index_track = range(store.length)
+            self._next_index = store.length
+
+    def _leave_columns(self):
+        '''Turn the columns back into the list of entries.'''
+        self._table = self._columns.rows_at(self._column_positions)
+        self._columns = None
+        self._column_positions = None
+
+    def _run_column_plan(self, plan):
+        '''Run the filter conditions that the columns can answer, in order,
+        and return the conditions that remain from the first one that can not.
+        '''
+        positions = self._column_positions
+        for (counter, condition) in enumerate(plan):
+            result = self._columns.run(positions, condition)
+            if result is None:
+                break
+            positions = result
+        else:
+            counter = len(plan)
+        if not positions is self._column_positions:
+            keep = set(positions)
+            self.index_track = [orig for (pos, orig) in zip(self._column_positions, self._index_track) if pos in keep]
+            self._column_positions = positions
+        return plan[counter:]
+
+    ############################
+    # Indexes
+    ############################
+
+    @hooks.instrumented
+    def createIndex(self, key, indexType="hash"):
+        '''Build an index on a key to speed up later lookups by that key.
+
+        A "hash" index maps each value found at the key to the entries holding
+        it. It answers eq and ne (with or without includeMissing) and the
+        search made by upsert without reading every entry. The comparison
+        rules are the same as without the index, including comparing the
+        str() of values of different types.
+
+        A "sorted" index keeps the values in order. It answers gt, gte, lt
+        and lte with a binary search rather than reading every entry, which
+        pays off for repeated range queries on a long-lived list (such as
+        time windows on a timestamp). Values of None and missing keys are
+        treated exactly as without the index.
+
+        An "inverted" index is for a key holding a list (such as tags). It
+        maps each entry of the lists to the entries holding it, and answers
+        contains (with any of its options) by combining those sets rather
+        than searching every list.
+
+        The index follows the changes made through PLOD itself (insert,
+        upsert, the delete methods, the filters and sort). If the entries
+        are modified directly, call createIndex again to rebuild it.
+
+        Example of use:
+
+        >>> test = [
+        ...    {"name": "Jim",   "age": 18, "income": 93000, "order": 2},
+        ...    {"name": "Larry", "age": 18,                  "order": 3},
+        ...    {"name": "Joe",   "age": 20, "income": 15000, "order": 1},
+        ...    {"name": "Bill",  "age": 19, "income": 29000, "order": 4},
+        ... ]
+        >>> my_plod = PLOD(test).createIndex("age")
+        >>> print my_plod.eq("age", "18").returnIndexList()
+        [0, 1]
+        >>> print my_plod.upsert("age", 18, {"name": "Jan", "age": 18}).returnString()
+        [
+            {age: 18, name: 'Jan'  , order: None},
+            {age: 18, name: 'Larry', order:    3}
+        ]
+        >>> nan = float("nan")
+        >>> my_plod = PLOD([{"age": 18}, {"age": nan}]).createIndex("age")
+        >>> print my_plod.eq("age", nan).returnIndexList()
+        []
+        >>> my_plod = PLOD(test).createIndex("income", indexType="sorted")
+        >>> print my_plod.gte("income", 20000).lt("income", 90000).returnIndexList()
+        [3]
+        >>> test = [
+        ...    {"name": "Jim",   "wigs": [9, 12]  },
+        ...    {"name": "Larry", "wigs": [3, 2, 9]},
+        ...    {"name": "Joe",   "wigs": [1, 2, 3]},
+        ...    {"name": "Bill"                    },
+        ... ]
+        >>> my_plod = PLOD(test).createIndex("wigs", indexType="inverted")
+        >>> print my_plod.contains("wigs", [2, 9], findAll=True).returnIndexList()
+        [1]
+        >>> print PLOD(test).createIndex("wigs", "inverted").contains("wigs", 9, exclude=True, includeMissing=True).returnIndexList()
+        [2, 3]
+
+        .. versionadded:: 0.1.8
+
+        :param key:
+           The dictionary key (or cascading list of keys) to index.
+        :param indexType:
+           "hash" (the default), "sorted" or "inverted".
+        :returns: self
+        '''
+        if not indexType in indexes.INDEX_TYPES:
+            raise ValueError("unknown indexType {}".format(repr(indexType)))
+        name = indexes.index_name(key)
+        if name is not None:
+            self._indexes.setdefault(name, {})[indexType] = self._build_index(indexType, key)
+        return self
+
+    @hooks.instrumented
+    def dropIndex(self, key):
+        '''Remove every index built on the key with createIndex.
+
+        .. versionadded:: 0.1.8
+
+        :param key:
+           The dictionary key (or cascading list of keys) that was indexed.
+        :returns: self
+        '''
+        self._indexes.pop(indexes.index_name(key), None)
+        return self
+
+    def _build_index(self, indexType, key):
+        index = indexes.INDEX_TYPES[indexType](key)
+        table = self.table
+        index.build(izip(self._orig_indices(), table))
+        return index
+
+    def _all_indexes(self):
+        result = []
+        for by_type in self._indexes.values():
+            result.extend(by_type.values())
+        return result
+
+    def _refresh_indexes(self):
+        '''Rebuild the indexes after the content of the entries changed.'''
+        for by_type in self._indexes.values():
+            for (indexType, index) in by_type.items():
+                by_type[indexType] = self._build_index(indexType, index.key)
+
+    def _index_lookup(self, condition):
+        '''Return the set of original indices passing the condition if an
+        index can answer it; otherwise return None.'''
+        if not self._indexes:
+            return None
+        by_type = self._indexes.get(indexes.index_name(condition[1][0]))
+        if by_type:
+            for index in by_type.values():
+                result = index.lookup(condition)
+                if result is not None:
+                    return result
         return None
 
+    def _append(self, entry):
+        '''Append a new entry; it gets the next unused original index.'''
+        table = self.table
+        orig = self._next_index
+        self._next_index += 1
+        if self._positions is not None:
+            self._positions[orig] = len(table)
+        if not (self._index_track is None and orig==len(table)):
+            self.index_track.append(orig)
+        table.append(entry)
+        for index in self._all_indexes():
+            index.add(orig, entry)
+
     ############################
     # Attribute Modifications
     ############################
 
+    @hooks.instrumented
     def dropKey(self, key):
         '''Drop an attribute/element/key-value pair from all the dictionaries.
 
@@ -136,12 +884,18 @@ class PLOD(object):
            that should be removed.
         :returns: self
         '''
+        crawl = internal.compile_key(key)
         result = []
         for row in self.table:
-            result.append(internal.remove_member(row, key))
+            (target, tkey, _) = crawl(row)
+            if target is not None:
+                internal.delete_at(target, tkey)
+            result.append(row)
         self.table = result
+        self._refresh_indexes()
         return self
 
+    @hooks.instrumented
     def addKey(self, key, value):
         '''Insert a attribute/element/key-value pair to all the dictionaries.
 
@@ -185,6 +939,7 @@ class PLOD(object):
                 pass
             result.append(row)
         self.table = result
+        self._refresh_indexes()
         return self
 
 
@@ -192,6 +947,7 @@ class PLOD(object):
     # List Modifications
     ############################
 
+    @hooks.instrumented
     def upsert(self, key, value, entry):
         '''Update or Insert an entry into the list of dictionaries.
 
@@ -240,14 +996,30 @@ class PLOD(object):
         :returns:
            class
         '''
-        index=internal.get_index(self.table, key, self.EQUAL, value)
+        table = self.table
+        index = None
+        found = None
+        by_type = self._indexes.get(indexes.index_name(key))
+        if by_type and "hash" in by_type:
+            found = by_type["hash"].first_match(value)
+        if found is None:
+            index=internal.get_index(table, key, self.EQUAL, value)
+        else:
+            positions = self._position_map()
+            live = [positions[orig] for orig in found if orig in positions]
+            if live:
+                index = min(live)
         if index is None:
-            self.index_track.append(len(self.table))
-            self.table.append(entry)
+            self._append(entry)
         else:
-            self.table[index]=entry
+            table[index]=entry
+            orig = self._orig_indices()[index]
+            for one_index in self._all_indexes():
+                one_index.remove(orig)
+                one_index.add(orig, entry)
         return self
 
+    @hooks.instrumented
     def insert(self, new_entry):
         '''Insert a new entry to the end of the list of dictionaries.
 
@@ -273,10 +1045,10 @@ class PLOD(object):
         :param new_entry:
            The new list entry to insert.
         '''
-        self.index_track.append(len(self.table))
-        self.table.append(new_entry)
+        self._append(new_entry)
         return self
 
+    @hooks.instrumented
     def deleteByOrigIndex(self, index):
         """Removes a single entry from the list given the index reference.
 
@@ -317,16 +1089,9 @@ class PLOD(object):
         :return:
            self
         """
-        result = []
-        result_tracker = []
-        for counter, row in enumerate(self.table):
-            if self.index_track[counter] != index:
-                result.append(row)
-                result_tracker.append(self.index_track[counter])
-        self.table = result
-        self.index_track = result_tracker
-        return self
+        return self._delete(set([index]))
 
+    @hooks.instrumented
     def deleteByOrigIndexList(self, indexList):
         """Remove entries from the list given the index references.
 
@@ -352,8 +1117,8 @@ class PLOD(object):
         >>> listA = [0, 1]
         >>> print myPLOD.deleteByOrigIndexList(listA).returnString()
         [
-            {age: 20, income: 15000, name: 'Joe'  , wigs: [1, 2, 3]},
-            {age: 18, income: None , name: 'Larry', wigs: [3, 2, 9]}
+            {age: 19, income: 29000, name: 'Bill', wigs: None     },
+            {age: 20, income: 15000, name: 'Joe' , wigs: [1, 2, 3]}
         ]
 
         As you can see in the example, the list was sorted by 'name', which
@@ -361,22 +1126,24 @@ class PLOD(object):
         passed a [0, 1] (for the first and second entries), it removed 'Jim'
         and "Larry" since those were the original first and second entries.
 
+        The indices are gathered into a set once, so the entries are removed
+        in a single pass no matter how many indices are given.
+
         :param indexList:
-           A list of integer representing the places of entry in the original
-           list of dictionaries.
+           A list (or any other iterable) of integers representing the places
+           of entry in the original list of dictionaries.
         :return:
            self
         """
-        result = []
-        result_tracker = []
-        counter = 0
-        for row in self.table:
-            if not counter in indexList:
-                result.append(row)
-                result_tracker.append(self.index_track[counter])
-            counter += 1
-        self.table = result
-        self.index_track = result_tracker
+        return self._delete(set(indexList))
+
+    def _delete(self, remove):
+        '''Remove the entries whose original index is in the 'remove' set.'''
+        index_track = self._orig_indices()
+        if self._enter_view():
+            self.index_track = array('l', (orig for orig in index_track if not orig in remove))
+        else:
+            (self.table, self.index_track) = internal.remove_indices(self.table, index_track, remove)
         return self
 
 
@@ -385,6 +1152,7 @@ class PLOD(object):
     # List Sorting/Arrangement routines
     ############################
 
+    @hooks.instrumented
     def renumber(self, key, start=1, increment=1, insert=False):
         '''Incrementally number a key based on the current order of the list.
 
@@ -434,14 +1202,18 @@ class PLOD(object):
         counter = start
         if insert:
             self.addKey(key, 0)
+        crawl = internal.compile_key(key)
         for row in self.table:
-            if internal.detect_member(row, key):
-                row = internal.modify_member(row, key, counter)
+            (target, tkey, _) = crawl(row)
+            if target is not None:
+                internal.set_at(target, tkey, counter)
             result.append(row)
             counter += increment
         self.table = result
+        self._refresh_indexes()
         return self
 
+    @hooks.instrumented
     def sort(self, key, reverse=False, none_greater=False):
         '''Sort the list in the order of the dictionary key.
 
@@ -474,6 +1246,17 @@ class PLOD(object):
             {age: 19, income: 29000, name: 'Bill' , wigs: None     },
             {age: 20, income: 15000, name: 'Joe'  , wigs: [1, 2, 3]}
         ]
+
+        The sort is stable: entries with equal keys keep their order, also
+        when *reverse* is set.
+
+        >>> print PLOD(test).sort("age", reverse=True).returnString()
+        [
+            {age: 20, income: 15000, name: 'Joe'  , wigs: [1, 2, 3]},
+            {age: 19, income: 29000, name: 'Bill' , wigs: None     },
+            {age: 18, income: 93000, name: 'Jim'  , wigs:        68},
+            {age: 18, income: None , name: 'Larry', wigs: [3, 2, 9]}
+        ]
         
         .. versionadded:: 0.0.2
         
@@ -487,20 +1270,32 @@ class PLOD(object):
            pair are considered be of greater value than the non-missing values.
         :returns: self
         '''
-        for i in range(0, len(self.table)):
-            min = i
-            for j in range(i + 1, len(self.table)):
-                if internal.is_first_lessor(self.table[j], self.table[min], key, none_greater=none_greater, reverse=reverse):
-                    min = j
-            if i!=min:
-                self.table[i], self.table[min] = self.table[min], self.table[i] # swap
-                self.index_track[i], self.index_track[min] = self.index_track[min], self.index_track[i] # swap
+        if self._plan:
+            self._run_plan()
+        if self._columns is not None:
+            positions = self._column_positions
+            order = self._columns.sort_order(positions, key, none_greater=none_greater, reverse=reverse)
+            if order is not None:
+                index_track = self._orig_indices()
+                self._column_positions = [positions[i] for i in order]
+                self.index_track = array('l', (index_track[i] for i in order))
+                return self
+        index_track = self._orig_indices()
+        if self._enter_view():
+            rows = self._rows
+            order = internal.sort_order((rows[pos] for pos in index_track), key, none_greater=none_greater, reverse=reverse)
+            self.index_track = array('l', (index_track[i] for i in order))
+            return self
+        order = internal.sort_order(self.table, key, none_greater=none_greater, reverse=reverse)
+        self.table[:] = [self.table[i] for i in order]
+        self.index_track = array('l', (index_track[i] for i in order))
         return self
 
     #################################
     # filters
     #################################
 
+    @hooks.instrumented
     def eq(self, key, value, includeMissing=False):
         '''Return entries where the key's value is of equal (==) value.
 
@@ -534,9 +1329,9 @@ class PLOD(object):
            included.
         :returns: self
         '''
-        (self.table, self.index_track) = internal.select(self.table, self.index_track, key, self.EQUAL, value, includeMissing)
-        return self
+        return self._filter(("select", (key, self.EQUAL, value, includeMissing)))
 
+    @hooks.instrumented
     def ne(self, key, value, includeMissing=False):
         '''Return entries where the key's value is NOT of equal (!=) value.
 
@@ -573,9 +1368,9 @@ class PLOD(object):
            included.
         :returns: self
         '''
-        (self.table, self.index_track) = internal.select(self.table, self.index_track, key, self.NOT_EQUAL, value, includeMissing)
-        return self
+        return self._filter(("select", (key, self.NOT_EQUAL, value, includeMissing)))
 
+    @hooks.instrumented
     def gt(self, key, value, includeMissing=False):
         '''Return entries where the key's value is greater (>).
 
@@ -604,9 +1399,9 @@ class PLOD(object):
            included.
         :returns: self
         '''
-        (self.table, self.index_track) = internal.select(self.table, self.index_track, key, self.GREATER, value, includeMissing)
-        return self
+        return self._filter(("select", (key, self.GREATER, value, includeMissing)))
 
+    @hooks.instrumented
     def gte(self, key, value, includeMissing=False):
         '''Return entries where the key's value is greater or equal (>=).
 
@@ -636,9 +1431,9 @@ class PLOD(object):
            included.
         :returns: self
         '''
-        (self.table, self.index_track) = internal.select(self.table, self.index_track, key, self.GREATERorEQUAL, value, includeMissing)
-        return self
+        return self._filter(("select", (key, self.GREATERorEQUAL, value, includeMissing)))
 
+    @hooks.instrumented
     def lt(self, key, value, includeMissing=False):
         '''Return entries where the key's value is less (<).
 
@@ -668,9 +1463,9 @@ class PLOD(object):
            included.
         :returns: self
         '''
-        (self.table, self.index_track) = internal.select(self.table, self.index_track, key, self.LESS, value, includeMissing)
-        return self
+        return self._filter(("select", (key, self.LESS, value, includeMissing)))
 
+    @hooks.instrumented
     def lte(self, key, value, includeMissing=False):
         '''Return entries where the key's value is less or equal (=<).
 
@@ -701,9 +1496,9 @@ class PLOD(object):
            included.
         :returns: self
         '''
-        (self.table, self.index_track) = internal.select(self.table, self.index_track, key, self.LESSorEQUAL, value, includeMissing)
-        return self
+        return self._filter(("select", (key, self.LESSorEQUAL, value, includeMissing)))
 
+    @hooks.instrumented
     def hasKey(self, key, notNone=False):
         '''Return entries where the key is present.
 
@@ -736,19 +1531,9 @@ class PLOD(object):
            with a value of None is NOT considered missing.
         :returns: self
         '''
-        result = []
-        result_tracker = []
-
-        for counter, row in enumerate(self.table):
-            (target, _, value) = internal.dict_crawl(row, key)
-            if target:
-                if notNone==False or not value is None:
-                    result.append(row)
-                    result_tracker.append(self.index_track[counter])
-        self.table = result
-        self.index_track = result_tracker
-        return self
+        return self._filter(("has_key", (key, notNone)))
 
+    @hooks.instrumented
     def missingKey(self, key, notNone=False):
         '''Return entries where the key is NOT present.
 
@@ -779,17 +1564,9 @@ class PLOD(object):
            with a value of None is NOT considered missing.
         :returns: self
         '''
-        result = []
-        result_tracker = []
-        for counter, row in enumerate(self.table):
-            (target, _, value) = internal.dict_crawl(row, key)
-            if (not target) or (notNone and (value is None)):
-                result.append(row)
-                result_tracker.append(self.index_track[counter])
-        self.table = result
-        self.index_track = result_tracker
-        return self
+        return self._filter(("missing_key", (key, notNone)))
 
+    @hooks.instrumented
     def contains(self, key, value, findAll=False, exclude=False, includeMissing=False):
         '''Return entries that:
         
@@ -815,6 +1592,17 @@ class PLOD(object):
             {age: 20, income: 15000, name: 'Joe', wigs: [1, 2, 3]}
         ]
 
+        As with 'eq', a value of another type matches when the str() of each
+        is the same:
+
+        >>> print PLOD(test).contains("wigs", ["2", "9"], findAll=True).returnString()
+        [
+            {age: 18, name: 'Larry', wigs: [3, 2, 9]}
+        ]
+
+        The values are hashed once, so searching for a long list of values
+        costs little more than searching for one.
+
         .. versionadded:: 0.1.3b
         
         :param key:
@@ -844,32 +1632,97 @@ class PLOD(object):
         :returns:
            self
         '''
-        result = []
-        result_index = []
-        for counter, row in enumerate(self.table):
-            (target, tkey, target_list) = internal.dict_crawl(row, key)
-            if target:
-                if findAll:
-                    success = internal.list_match_all(target_list, value)
-                else:
-                    success = internal.list_match_any(target_list, value)
-                if exclude:
-                    success = not success
-                if success:
-                    result.append(row)
-                    result_index.append(self.index_track[counter])
-                else:
-                    # item missing from list, so skip over
-                    pass
-            else:
-                if includeMissing:
-                    result.append(row)
-                    result_index.append(self.index_track[counter])
-                else:
-                    pass
-        self.table = result
-        self.index_track = result_index
-        return self
+        return self._filter(("contains", (key, value, findAll, exclude, includeMissing)))
+
+    @hooks.instrumented
+    def where(self, expression):
+        '''Return entries for which a Python-like expression is true.
+
+        The expression may combine any number of comparisons with "and",
+        "or", "not" and parentheses. It is parsed once (and cached) and then
+        tested against each entry in a single pass, stopping at the first
+        comparison that decides the result. Keys are written as names, with
+        dots (or brackets) reaching into subtending dictionaries:
+
+        * "==", "!=", "<", "<=", ">" and ">=" compare as eq, ne, lt, lte, gt
+          and gte do, including the treatment of None and the comparison of
+          str() values for "==" and "!=" on values of different types.
+        * "in" and "not in" check whether the value (or, for a list, any of
+          its entries) is equal to any of the values listed.
+        * a key on its own is true if its value is true.
+
+        Any comparison involving a key that the entry is missing is false,
+        so use "not" to include such entries.
+
+        Example of use:
+
+        >>> fruits = [
+        ...    {"name": "banana", "color": "yellow", "qty": 9, "zip": {"zap": 12}},
+        ...    {"name": "cherry",                    "qty": 40                   },
+        ...    {"name": "lime",   "color": "green",  "qty": 2, "zip": {"zap": 65}},
+        ...    {"name": "lemon",  "color": "yellow", "qty": 3, "zip": {"zap": 65}},
+        ... ]
+        >>> print PLOD(fruits).where("qty > 5 and color == 'yellow' or zip.zap in [65]").returnIndexList()
+        [0, 2, 3]
+        >>> print PLOD(fruits).where("not (color in ['green', 'yellow'])").returnIndexList()
+        [1]
+        >>> print PLOD(fruits).where("3 <= qty < 40 and zip['zap'] != '65'").returnIndexList()
+        [0]
+
+        .. versionadded:: 0.1.8
+
+        :param expression:
+           A string holding the expression.
+        :returns:
+           self
+        '''
+        expressions.compile_expression(expression) # raise any error now
+        return self._filter(("where", (expression,)))
+
+    @hooks.instrumented
+    def find(self, document):
+        '''Return entries matching a MongoDB-style query document.
+
+        The document is compiled once and tested against each entry in a
+        single pass. The operators map onto the PLOD filters:
+
+        * {"key": value} and {"key": {"$eq": value}} are eq.
+        * "$ne" is ne with includeMissing (as in MongoDB).
+        * "$gt", "$gte", "$lt" and "$lte" are gt, gte, lt and lte.
+        * "$in" matches a value (or a list with an entry) equal to any listed;
+          a None listed also matches a missing key. "$nin" is the opposite.
+        * "$all" is contains with findAll.
+        * {"$exists": True} is hasKey; {"$exists": False} is missingKey.
+        * "$size" matches a list with that many entries and "$regex" (with
+          "$options") searches the str() of the value.
+        * "$not", "$and", "$or" and "$nor" combine the above.
+
+        A key may use dots to reach into subtending dictionaries. The simple
+        operators are run as the matching filters, so an index (see
+        createIndex) can answer them.
+
+        Example of use:
+
+        >>> test = [
+        ...    {"name": "bannana", "color": "yellow", "qty": 9,  "sizes": [2, 2.4, 3]},
+        ...    {"name": "cherry",                     "qty": 40, "sizes": [3, 2, 9]},
+        ...    {"name": "lime",    "color": "green",  "qty": 2,  "sizes": [2]},
+        ... ]
+        >>> print PLOD(test).find({"qty": {"$gt": 5}, "sizes": {"$all": [2, 3]}, "color": {"$exists": False}}).returnIndexList()
+        [1]
+        >>> print PLOD(test).find({"$or": [{"color": "green"}, {"qty": {"$gte": 40}}]}).returnIndexList()
+        [1, 2]
+        >>> print PLOD(test).find({"color": {"$nin": ["yellow"]}, "name": {"$regex": "^L", "$options": "i"}}).returnIndexList()
+        [2]
+
+        .. versionadded:: 0.1.8
+
+        :param document:
+           The query document, a dictionary.
+        :returns:
+           self
+        '''
+        return self._filter(*queries.query_conditions(copy.deepcopy(document)))
 
 
 
@@ -877,6 +1730,7 @@ class PLOD(object):
     #  Means of Returning Results
     ##############################
 
+    @hooks.instrumented
     def returnList(self, limit=False):
         '''Return a list of dictionaries (and *not* a PLOD class).
 
@@ -912,6 +1766,39 @@ class PLOD(object):
                 result.append(self.table[i])
         return result
 
+    def iterList(self, limit=False):
+        '''Return a generator of the entries of the current list, as given
+        (and in the order) by returnList.
+
+        Unlike returnList, no list is built: when the entries have only been
+        filtered or sorted, they are read in place from the original list.
+        This suits handing a large result on to a file or a socket. Do not
+        change the PLOD while reading the generator.
+
+        Example of use:
+
+        >>> test = [
+        ...    {"name": "Jim",   "age": 18, "income": 93000, "wigs": [9, 12]  },
+        ...    {"name": "Larry", "age": 18,                  "wigs": [3, 2, 9]},
+        ...    {"name": "Joe",   "age": 20, "income": 15000, "wigs": [1, 2, 3]},
+        ...    {"name": "Bill",  "age": 19, "income": 29000                   },
+        ... ]
+        >>> for entry in PLOD(test).gt("age", 18).sort("name").iterList():
+        ...     print entry["name"]
+        Bill
+        Joe
+
+        .. versionadded:: 0.1.8
+
+        :param limit:
+           A number limiting the quantity of entries to return. Defaults to
+           False, which means that the full list is returned.
+        :return:
+           A generator of the entries.
+        '''
+        return (entry for (orig, entry) in self._iter_entries(limit))
+
+    @hooks.instrumented
     def returnLOD(self, limit=False):
         '''Return a TRUE list of dictionaries (and *not* a PLOD class).
 
@@ -919,16 +1806,38 @@ class PLOD(object):
         dictionaries. So, for example, a list of objects would be returned as
         an interpreted list of dictionaries instead.
         '''
+        return list(self.iterLOD(limit))
 
-        if limit==False:
-            limit = len(self.table)
-        result = []
-        if limit:
-            for i in range(limit):
-                result.append(internal.convert_to_dict(self.table[i]))
-        return result
+    def iterLOD(self, limit=False):
+        '''Return a generator of the entries of the current list as true
+        dictionaries, as given by returnLOD.
+
+        Each entry is converted only when it is reached, so a list of objects
+        is never held twice. See iterList.
+
+        Example of use:
 
+        >>> from collections import namedtuple
+        >>> Person = namedtuple("Person", ["name", "age"])
+        >>> test = [Person("Jim", 18), Person("Larry", 20), Person("Joe", 19)]
+        >>> for entry in PLOD(test).gt("age", 18).iterLOD():
+        ...     print sorted(entry.items())
+        [('age', 20), ('name', 'Larry')]
+        [('age', 19), ('name', 'Joe')]
 
+        .. versionadded:: 0.1.8
+
+        :param limit:
+           A number limiting the quantity of entries to return. Defaults to
+           False, which means that the full list is returned.
+        :return:
+           A generator of dictionaries.
+        '''
+        convert_to_dict = internal.convert_to_dict
+        return (convert_to_dict(entry) for (orig, entry) in self._iter_entries(limit))
+
+
+    @hooks.instrumented
     def returnString(self, limit=False, omitBrackets=False, executable=False, honorMissing=False):
         '''Return a string containing the list of dictionaries in easy
         human-readable read format.
@@ -983,86 +1892,94 @@ class PLOD(object):
            A string containing a formatted textual representation of the list
            of dictionaries.
         '''
-        result = ""
+        return "".join(self.iterString(limit=limit, omitBrackets=omitBrackets, executable=executable, honorMissing=honorMissing))
+
+    def iterString(self, limit=False, omitBrackets=False, executable=False, honorMissing=False, pageSize=None):
+        '''Return a generator of the text made by returnString, piece by piece.
+
+        Joining the pieces gives exactly the string returned by returnString
+        with the same parameters. Each entry is converted and each value is
+        passed to repr() only once.
+
+        If *pageSize* is given, the entries are handled a page at a time:
+        only the entries of a page are converted and measured, and the keys
+        and widths are lined up within each page rather than across the
+        whole list. This keeps the memory used for dumping a large list
+        small.
+
+        Example of use:
+
+        >>> test = [
+        ...    {"name": "Jim",   "age": 18, "income": 93000, "order": 2},
+        ...    {"name": "Larry", "age": 18,                  "order": 3},
+        ...    {"name": "Joe",   "age": 20, "income": 15000, "order": 1},
+        ... ]
+        >>> print "".join(PLOD(test).iterString(pageSize=2))
+        [
+            {age: 18, income: 93000, name: 'Jim'  , order: 2},
+            {age: 18, income: None , name: 'Larry', order: 3},
+            {age: 20, income: 15000, name: 'Joe', order: 1}
+        ]
+
+        .. versionadded:: 0.1.8
+
+        See returnString for the *limit*, *omitBrackets*, *executable* and
+        *honorMissing* parameters.
+
+        :param pageSize:
+           The number of entries measured and lined up together. Defaults to
+           None, which means that the full list is one page.
+        :return:
+           A generator of strings.
+        '''
         # we limit the table if needed
-        if not limit:
-            limit = len(self.table)
-        used_table = []
-        for i in range(limit):
-            if len(self.table)>i:
-                used_table.append(internal.convert_to_dict(self.table[i]))
-        # we locate all of the attributes and their lengths
-        attr_width = {}
-        # first pass to get the keys themselves
-        for row in used_table:
-            for key in row:
-                if not key in attr_width:
-                    attr_width[key] = 0
-        # get a sorted list of keys
-        attr_order = attr_width.keys()
-        attr_order.sort()
-        # not get minimum widths
-        #  (this is done as a seperate step to account for 'None' and other conditions.
-        for row in used_table:
-            for key in attr_width:
-                if not key in row:
-                    if not honorMissing:
-                        if attr_width[key] < len("None"):
-                            attr_width[key] = len("None")
-                else:
-                    if len(repr(row[key])) > attr_width[key]:
-                        attr_width[key] = len(repr(row[key]))
-        # now we do the pretty print
+        used_table = self.table
+        if limit:
+            used_table = used_table[:max(limit, 0)]
+        if not pageSize:
+            pageSize = max(len(used_table), 1)
         if not omitBrackets:
-            result += "[\n"
-        body = []
-        for row in used_table:
-            row_string = ""
-            if not omitBrackets:
-                row_string += "    "
-            row_string += "{"
-            middle = []
-            for key in attr_order:
-                if key in row:
-                    # build the key
-                    if executable:
-                        item = "'"+str(key) + "': "
-                    else:
-                        item = str(key) + ": "
-                    # build the value
-                    s = repr(row[key])
-                    if type(row[key]) is typemod.IntType:
-                        s = s.rjust(attr_width[key])
-                else:
-                    if honorMissing:
-                        # build the key
-                        item = " "*len(str(key))
-                        if executable:
-                            item += "  "
-                        item +=  "  "
-                        # build the value
-                        s=""
-                    else:
-                        # build the key
-                        if executable:
-                            item = "'"+str(key) + "': "
-                        else:
-                            item = str(key) + ": "
-                        # build the value
-                        s = "None"
-                item += s.ljust(attr_width[key])
-                middle.append(item)
-            # row_string += ", ".join(middle)
-            row_string += internal.special_join(middle)
-            row_string += "}"
-            body.append(row_string)
-        result += ",\n".join(body)
-        if len(body) and not omitBrackets:
-            result += "\n"
+            yield "[\n"
+        separator = ""
+        for start in range(0, len(used_table), pageSize):
+            page = [internal.convert_to_dict(row) for row in used_table[start:start+pageSize]]
+            for line in internal.string_lines(page, not omitBrackets, executable, honorMissing):
+                yield separator + line
+                separator = ",\n"
         if not omitBrackets:
-            result += "]"
-        return result
+            if separator:
+                yield "\n"
+            yield "]"
+
+    @hooks.instrumented
+    def writeString(self, fileobj, limit=False, omitBrackets=False, executable=False, honorMissing=False, pageSize=None):
+        '''Write the text made by returnString to a file-like object.
+
+        The text is written a line at a time as it is made. See iterString
+        for the *pageSize* parameter and returnString for the others.
+
+        Example of use:
+
+        >>> import sys
+        >>> test = [
+        ...    {"name": "Jim",   "age": 18, "income": 93000, "order": 2},
+        ...    {"name": "Larry", "age": 18,                  "order": 3},
+        ... ]
+        >>> PLOD(test).writeString(sys.stdout, omitBrackets=True, honorMissing=True)
+        {age: 18, income: 93000, name: 'Jim'  , order: 2},
+        {age: 18,                name: 'Larry', order: 3}
 
+        .. versionadded:: 0.1.8
+
+        :param fileobj:
+           Any object with a write() method, such as an open file.
+        :return:
+           None
+        '''
+        for piece in self.iterString(limit=limit, omitBrackets=omitBrackets, executable=executable, honorMissing=honorMissing, pageSize=pageSize):
+            fileobj.write(piece)
+
+    @hooks.instrumented
     def returnCSV(self, keys=None, limit=False, omitHeaderLine=False, quoteChar=None, eolChars='\r\n'):
         r'''Return a list of dictionaries formated as a comma seperated values
         (CSV) list in a string.
@@ -1138,67 +2055,98 @@ class PLOD(object):
            A string containing a formatted textual representation of the list
            of dictionaries.
         '''
-        result = ""
-        if quoteChar:
-            quoteAll=True
-        else:
-            quoteAll=False
+        return "".join(self.iterCSV(keys=keys, limit=limit, omitHeaderLine=omitHeaderLine, quoteChar=quoteChar, eolChars=eolChars))
+
+    def iterCSV(self, keys=None, limit=False, omitHeaderLine=False, quoteChar=None, eolChars='\r\n', chunkSize=1000):
+        r'''Return a generator of the CSV text made by returnCSV, in chunks.
+
+        Each chunk is a string holding up to *chunkSize* complete lines (the
+        header line, if any, is a chunk of its own). Joining the chunks gives
+        exactly the string returned by returnCSV with the same parameters,
+        but the whole text never has to be held in memory at once.
+
+        Example of use:
+
+        >>> test = [
+        ...    {"name": "Jim",   "age": 18, "income": 93000, "order": 2},
+        ...    {"name": "Larry", "age": 18,                  "order": 3},
+        ...    {"name": "Joe",   "age": 20, "income": 15000, "order": 1},
+        ... ]
+        >>> for chunk in PLOD(test).iterCSV(keys=["name", "age"], eolChars='\n', chunkSize=2):
+        ...     print repr(chunk)
+        'name,age\n'
+        'Jim,18\nLarry,18\n'
+        'Joe,20\n'
+
+        .. versionadded:: 0.1.8
+
+        See returnCSV for the *keys*, *limit*, *omitHeaderLine*, *quoteChar*
+        and *eolChars* parameters.
+
+        :param chunkSize:
+           The number of lines gathered into each chunk. Defaults to 1000.
+        :return:
+           A generator of strings.
+        '''
         # we limit the table if needed
         used_table = self.table
         if limit:
-            used_table = []
-            for i in range(limit):
-                if len(self.table)>i:
-                    used_table.append(self.table[i])
+            used_table = used_table[:max(limit, 0)]
         # we locate all of the attributes
         if keys:
             attr_list = keys
         else:
-            attr_list = []
-            for row in used_table:
-                for key in row:
-                    if not key in attr_list:
-                        attr_list.append(key)
-        # now we do the pretty print
+            attr_list = internal.csv_keys(used_table)
         if not omitHeaderLine:
-            if quoteAll:
-                result += quoteChar
-                temp = quoteChar+","+quoteChar
-                result += temp.join(attr_list)
-                result += quoteChar
-            else:
-                result += ",".join(attr_list)
-            result += eolChars
+            yield internal.csv_header(attr_list, quoteChar, eolChars)
+        chunk = []
         for row in used_table:
-            ml = []
-            for ctr, key in enumerate(attr_list):
-                if key in row:
-                    if row[key] is None:
-                        value = ""
-                    else:
-                        value = str(row[key])
-                    if quoteAll:
-                        ml.append(internal.csv_quote(quoteChar,value))
-                    else:
-                        if ('"' in value) or (',' in value):
-                            ml.append(internal.csv_quote('"', value))
-                        else:
-                            if ((ctr+1)==len(attr_list)) and (len(value)==0):
-                                ml.append('""')
-                            else:
-                                ml.append(value)
-                else:
-                    if quoteAll:
-                        ml.append(quoteChar+quoteChar)
-                    else:
-                        if (ctr+1)==len(attr_list):
-                            ml.append('""')
-                        else:
-                            ml.append("")
-            result += ",".join(ml)
-            result += eolChars
-        return result
+            chunk.append(internal.csv_line(row, attr_list, quoteChar, eolChars))
+            if len(chunk)>=chunkSize:
+                yield "".join(chunk)
+                chunk = []
+        if chunk:
+            yield "".join(chunk)
+
+    @hooks.instrumented
+    def writeCSV(self, fileobj, keys=None, limit=False, omitHeaderLine=False, quoteChar=None, eolChars='\r\n', chunkSize=1000):
+        r'''Write the CSV text made by returnCSV to a file-like object.
+
+        The text is written in chunks of *chunkSize* lines as it is made, so
+        even a very large export runs in a small, constant amount of memory.
+
+        Example of use:
+
+        >>> import StringIO
+        >>> test = [
+        ...    {"name": "Jim",   "age": 18, "income": 93000, "order": 2},
+        ...    {"name": "Larry", "age": 18,                  "order": 3},
+        ... ]
+        >>> out = StringIO.StringIO()
+        >>> PLOD(test).writeCSV(out, keys=["name", "income"], eolChars='\n')
+        >>> print out.getvalue()
+        name,income
+        Jim,93000
+        Larry,""
+        <BLANKLINE>
+
+        .. versionadded:: 0.1.8
 
+        See returnCSV for the *keys*, *limit*, *omitHeaderLine*, *quoteChar*
+        and *eolChars* parameters.
+
+        :param fileobj:
+           Any object with a write() method, such as an open file.
+        :param chunkSize:
+           The number of lines written with each call to write(). Defaults
+           to 1000.
+        :return:
+           None
+        '''
+        for chunk in self.iterCSV(keys=keys, limit=limit, omitHeaderLine=omitHeaderLine, quoteChar=quoteChar, eolChars=eolChars, chunkSize=chunkSize):
+            fileobj.write(chunk)
+
+    @hooks.instrumented
     def returnIndexList(self, limit=False):
         '''Return a list of integers that are list-index references to the
         original list of dictionaries."
@@ -1222,15 +2170,41 @@ class PLOD(object):
         :return:
            A list of integers representing the original indices.
         '''
+        index_track = self._orig_indices()
         if limit==False:
-            return self.index_track
-        result = []
-        for i in range(limit):
-            if len(self.table)>i:
-                result.append(self.index_track[i])
-        return result
+            return list(index_track)
+        return [index_track[i] for i in xrange(min(limit, len(index_track)))]
+
+    def iterIndexList(self, limit=False):
+        '''Return a generator of (original index, entry) pairs for the
+        current list: the index returnIndexList gives for each entry, with
+        the entry itself. See iterList.
 
+        Example of use:
 
+        >>> test = [
+        ...    {"name": "Jim",   "age": 18, "income": 93000, "order": 2},
+        ...    {"name": "Larry", "age": 18,                  "order": 3},
+        ...    {"name": "Joe",   "age": 20, "income": 15000, "order": 1},
+        ...    {"name": "Bill",  "age": 19, "income": 29000, "order": 4},
+        ... ]
+        >>> for (index, entry) in PLOD(test).sort("order").iterIndexList(limit=2):
+        ...     print index, entry["name"]
+        2 Joe
+        0 Jim
+
+        .. versionadded:: 0.1.8
+
+        :param limit:
+           A number limiting the quantity of entries to return. Defaults to
+           False, which means that the full list is returned.
+        :return:
+           A generator of (integer, entry) tuples.
+        '''
+        return self._iter_entries(limit)
+
+
+    @hooks.instrumented
     def returnOneIndex(self, last=False):
         '''Return the first origin index (integer) of the current list. That
         index refers to it's placement in the original list of dictionaries.
@@ -1251,21 +2225,41 @@ class PLOD(object):
         >>> print PLOD(test).sort("name").returnOneIndex()
         3
 
+        Reading the last origin does not change the list:
+
+        >>> my_plod = PLOD(test).gt("age", 18)
+        >>> print my_plod.returnOneIndex(last=True)
+        3
+        >>> print my_plod.returnOneIndex(last=True)
+        3
+        >>> print my_plod.count()
+        2
+        >>> print len(my_plod.returnList())
+        2
+        >>> my_plod = PLOD(test)
+        >>> print my_plod.returnOneIndex(last=True)
+        3
+        >>> print my_plod.returnOneIndex(last=True)
+        3
+        >>> print my_plod.count()
+        4
+
         :param last:
            The last origin of the current list is returned rather than the first.
         :return:
            An integer representing the original placement of the first item in
            the list. Returns None if the list is currently empty.
         '''
-        if len(self.table)==0:
+        if len(self._orig_indices())==0:
             return None
         else:
             if last:
-                return self.index_track.pop()
+                return self._orig_indices()[-1]
             else:
-                return self.index_track[0]
+                return self._orig_indices()[0]
 
 
+    @hooks.instrumented
     def returnOneEntry(self, last=False):
         '''Return the first entry in the current list. If 'last=True', then
         the last entry is returned."
@@ -1298,6 +2292,7 @@ class PLOD(object):
             else:
                 return self.table[0]
 
+    @hooks.instrumented
     def returnValue(self, key, last=False):
         '''Return the key's value for the first entry in the current list.
         If 'last=True', then the last entry is referenced."
@@ -1327,9 +2322,9 @@ class PLOD(object):
         row = self.returnOneEntry(last=last)
         if not row:
             return None
-        dict_row = internal.convert_to_dict(row)
-        return dict_row.get(key, None)
+        return internal.get_value(row, key)
 
+    @hooks.instrumented
     def returnValueList(self, key_list, last=False):
         '''Return a list of key values for the first entry in the current list.
         If 'last=True', then the last entry is referenced."
@@ -1359,11 +2354,11 @@ class PLOD(object):
         row = self.returnOneEntry(last=last)
         if not row:
             return None
-        dict_row = internal.convert_to_dict(row)
         for field in key_list:
-            result.append(dict_row.get(field, None))
+            result.append(internal.get_value(row, field))
         return result
     
+    @hooks.instrumented
     def found(self):
         '''Return True if list has at least one entry; otherwise return False.
 
@@ -1383,10 +2378,11 @@ class PLOD(object):
         :return:
            True if list has at least one entry, else False.
         '''
-        if len(self.table)==0:
+        if len(self._orig_indices())==0:
             return False
         return True
 
+    @hooks.instrumented
     def missing(self):
         '''Return True if list is empty; otherwise return False.
 
@@ -1407,10 +2403,11 @@ class PLOD(object):
         :return:
            False if list has one ore more entries, else True.
         '''
-        if len(self.table)==0:
+        if len(self._orig_indices())==0:
             return True
         return False
 
+    @hooks.instrumented
     def count(self):
         '''Return an integer representing the number of items in the list.
 
@@ -1432,7 +2429,7 @@ class PLOD(object):
         :return:
            Integer representing the number of items in the list.
         '''
-        return len(self.table)
+        return len(self._orig_indices())
 
 
 if __name__ == "__main__":
@@ -1469,6 +2466,17 @@ if __name__ == "__main__":
         print doctest.run_docstring_examples(PLOD.insert, None)
         print doctest.run_docstring_examples(PLOD.deleteByOrigIndex, None)
         print doctest.run_docstring_examples(PLOD.deleteByOrigIndexList, None)
+        # list hooks
+        print doctest.run_docstring_examples(PLOD.addHook, None)
+        # row types
+        print doctest.run_docstring_examples(PLOD.registerRowType, None)
+        # slow path tracking
+        print doctest.run_docstring_examples(PLOD.trackSlowPaths, None)
+        # columnar storage
+        print doctest.run_docstring_examples(PLOD.fromColumns, None)
+        print doctest.run_docstring_examples(PLOD.toColumnar, None)
+        # indexes
+        print doctest.run_docstring_examples(PLOD.createIndex, None)
         # list arrangement
         print doctest.run_docstring_examples(PLOD.renumber, None)
         print doctest.run_docstring_examples(PLOD.sort, None)
@@ -1482,11 +2490,21 @@ if __name__ == "__main__":
         print doctest.run_docstring_examples(PLOD.hasKey, None)
         print doctest.run_docstring_examples(PLOD.missingKey, None)
         print doctest.run_docstring_examples(PLOD.contains, None)
+        # list queries
+        print doctest.run_docstring_examples(PLOD.where, None)
+        print doctest.run_docstring_examples(PLOD.find, None)
         # list return results
         print doctest.run_docstring_examples(PLOD.returnList, None)
+        print doctest.run_docstring_examples(PLOD.iterList, None)
+        print doctest.run_docstring_examples(PLOD.iterLOD, None)
         print doctest.run_docstring_examples(PLOD.returnString, None)
+        print doctest.run_docstring_examples(PLOD.iterString, None)
+        print doctest.run_docstring_examples(PLOD.writeString, None)
         print doctest.run_docstring_examples(PLOD.returnCSV, None)
+        print doctest.run_docstring_examples(PLOD.iterCSV, None)
+        print doctest.run_docstring_examples(PLOD.writeCSV, None)
         print doctest.run_docstring_examples(PLOD.returnIndexList, None)
+        print doctest.run_docstring_examples(PLOD.iterIndexList, None)
         print doctest.run_docstring_examples(PLOD.returnOneIndex, None)
         print doctest.run_docstring_examples(PLOD.returnOneEntry, None)
         print doctest.run_docstring_examples(PLOD.returnValue, None)
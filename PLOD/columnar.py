@@ -0,0 +1,251 @@
+# PLOD\columnar.py
+#
+# Pythonic List of Dictionary module/class (PLOD)
+#
+# COLUMNAR SUPPORT ROUTINES
+#
+# A ColumnStore keeps a table as one column per key instead of one
+# dictionary per row. A column of plain integers or floats is held in a
+# typed array (see the standard 'array' module); any other column is a list.
+# Each column also has a mask telling whether the key is missing, present or
+# present with a value of None in each row.
+#
+# Filters and sorts on a single key run over a column directly rather than
+# crawling each row. Each is still a Python loop over the positions, one
+# entry at a time; what it saves is the crawl of each row and the dispatch on
+# its type (see the *_columnar cases of benchmarks/bench_plod.py). Keys that
+# reach into nested rows, and anything else, are done by turning the columns
+# back into rows (see PLOD.toColumnar and PLOD.fromColumns).
+#
+
+import internal
+import operator
+from array import array
+
+ABSENT = 0
+PRESENT = 1
+IS_NONE = 2
+
+class Missing(object):
+    ''' marks a missing key in the lists given to PLOD.fromColumns '''
+    def __repr__(self):
+        return "MISSING"
+
+MISSING = Missing()
+
+NUMBER_TYPES = (int, long, float, bool)
+
+class Column(object):
+
+    def __init__(self, values, mask):
+        self.mask = mask
+        kinds = set(type(values[pos]) for pos in xrange(len(values)) if mask[pos]==PRESENT)
+        if kinds==set([int]):
+            self.values = array('l', (value if mask[pos]==PRESENT else 0 for (pos, value) in enumerate(values)))
+            self.numeric = True
+        elif kinds==set([float]):
+            self.values = array('d', (value if mask[pos]==PRESENT else 0.0 for (pos, value) in enumerate(values)))
+            self.numeric = True
+        else:
+            self.values = values
+            self.numeric = False
+
+    def value(self, pos):
+        if self.mask[pos]==PRESENT:
+            return self.values[pos]
+        return None
+
+    def select(self, positions, op, value, includeMissing):
+        mask = self.mask
+        values = self.values
+        result = []
+        if op==internal.NOOP:
+            return [pos for pos in positions if mask[pos]!=ABSENT or includeMissing]
+        if value is None:
+            # do_op: None only compares as True with None
+            for pos in positions:
+                state = mask[pos]
+                if state==IS_NONE or (state==ABSENT and includeMissing):
+                    result.append(pos)
+            return result
+        if self.numeric and type(value) in NUMBER_TYPES:
+            # for numbers of any type, EQUAL never needs the str() fallback
+            compare = NUMERIC_OPS[op]
+            if not includeMissing:
+                return [pos for pos in positions if mask[pos]==PRESENT and compare(values[pos], value)]
+            for pos in positions:
+                state = mask[pos]
+                if state==PRESENT:
+                    if compare(values[pos], value):
+                        result.append(pos)
+                elif state==ABSENT:
+                    result.append(pos)
+            return result
+        compare = internal.make_comparator(op, value)
+        for pos in positions:
+            state = mask[pos]
+            if state==PRESENT:
+                if compare(values[pos]):
+                    result.append(pos)
+            elif state==ABSENT and includeMissing:
+                result.append(pos)
+        return result
+
+NUMERIC_OPS = {
+    internal.LESS:           operator.lt,
+    internal.LESSorEQUAL:    operator.le,
+    internal.EQUAL:          operator.eq,
+    internal.GREATERorEQUAL: operator.ge,
+    internal.GREATER:        operator.gt,
+    internal.NOT_EQUAL:      operator.ne,
+}
+
+class ColumnStore(object):
+
+    def __init__(self, columns, length, rows=None):
+        self.columns = columns      # key -> Column
+        self.length = length
+        self.rows = rows            # the original rows, if built from rows
+
+    @classmethod
+    def from_columns(cls, columns):
+        length = None
+        result = {}
+        for (key, values) in columns.items():
+            values = list(values)
+            if length is None:
+                length = len(values)
+            elif len(values)!=length:
+                raise ValueError("column {} has {} entries rather than {}".format(repr(key), len(values), length))
+            mask = bytearray(length)
+            for (pos, value) in enumerate(values):
+                if value is MISSING:
+                    values[pos] = None
+                elif value is None:
+                    mask[pos] = IS_NONE
+                else:
+                    mask[pos] = PRESENT
+            result[key] = Column(values, mask)
+        return cls(result, length or 0)
+
+    @classmethod
+    def from_rows(cls, rows):
+        length = len(rows)
+        values = {}
+        masks = {}
+        for (pos, row) in enumerate(rows):
+            dict_row = internal.convert_to_dict(row)
+            for key in dict_row:
+                if not key in values:
+                    values[key] = [None]*length
+                    masks[key] = bytearray(length)
+                value = dict_row[key]
+                values[key][pos] = value
+                if value is None:
+                    masks[key][pos] = IS_NONE
+                else:
+                    masks[key][pos] = PRESENT
+        columns = dict((key, Column(values[key], masks[key])) for key in values)
+        return cls(columns, length, rows=rows)
+
+    def column_name(self, key):
+        ''' returns the column holding a key, False if no row has the key, or
+        None if the key is not a simple key that a column can answer.
+        '''
+        path = internal.key_path(key)
+        if len(path)!=1:
+            return None
+        try:
+            if path[0] in self.columns:
+                return path[0]
+        except TypeError:
+            return None
+        if isinstance(path[0], basestring) and '.' in path[0]:
+            return None # might be a dotted key list
+        return False
+
+    def select(self, positions, key, op, value, includeMissing):
+        name = self.column_name(key)
+        if name is None:
+            return None
+        if name is False:
+            if includeMissing:
+                return list(positions)
+            return []
+        return self.columns[name].select(positions, op, value, includeMissing)
+
+    def has_key(self, positions, key, notNone, missing=False):
+        name = self.column_name(key)
+        if name is None:
+            return None
+        if name is False:
+            if missing:
+                return list(positions)
+            return []
+        mask = self.columns[name].mask
+        if notNone:
+            keep = set([PRESENT])
+        else:
+            keep = set([PRESENT, IS_NONE])
+        return [pos for pos in positions if (mask[pos] in keep)!=missing]
+
+    def run(self, positions, condition):
+        ''' returns the positions passing the condition (see
+        internal.compile_condition), or None if it can not be done on the
+        columns.
+        '''
+        (name, args) = condition
+        if name=="select":
+            return self.select(positions, *args)
+        if name=="has_key":
+            return self.has_key(positions, args[0], args[1])
+        if name=="missing_key":
+            return self.has_key(positions, args[0], args[1], missing=True)
+        return None
+
+    def sort_order(self, positions, key_field, none_greater=False, reverse=False):
+        ''' returns the order of the positions as internal.sort_order would
+        give for the rows, or None if a key is not a simple key.
+        '''
+        if not type(key_field) is list:
+            key_field = [key_field]
+        if none_greater:
+            missing = (2,)
+        else:
+            missing = (0,)
+        keys = [[] for pos in positions]
+        for one_key in key_field:
+            name = self.column_name(one_key)
+            if name is None:
+                return None
+            if name is False:
+                for entry in keys:
+                    entry.append(missing)
+                continue
+            column = self.columns[name]
+            for (counter, pos) in enumerate(positions):
+                value = column.value(pos)
+                if value:
+                    keys[counter].append((1, value))
+                else:
+                    keys[counter].append(missing)
+        return sorted(range(len(keys)), key=keys.__getitem__, reverse=reverse)
+
+    def rows_at(self, positions):
+        ''' returns the rows at the positions; when the store was not built
+        from rows, each row is made into a new dictionary.
+        '''
+        if self.rows is not None:
+            rows = self.rows
+            return [rows[pos] for pos in positions]
+        result = [{} for pos in positions]
+        for (key, column) in self.columns.items():
+            mask = column.mask
+            values = column.values
+            for (counter, pos) in enumerate(positions):
+                state = mask[pos]
+                if state==PRESENT:
+                    result[counter][key] = values[pos]
+                elif state==IS_NONE:
+                    result[counter][key] = None
+        return result
@@ -0,0 +1,188 @@
+# PLOD\expressions.py
+#
+# Pythonic List of Dictionary module/class (PLOD)
+#
+# EXPRESSION SUPPORT ROUTINES
+#
+# An expression given to PLOD.where is parsed (with the standard 'ast' module)
+# once into a predicate: a function of one row returning True or False. The
+# most recent predicates are cached by the text of the expression (see
+# internal.cache_compiled).
+#
+# Supported:
+#
+#    comparisons:    ==  !=  <  <=  >  >=  (chained as in "18 <= age < 30")
+#    membership:     in  not in  (as PLOD.contains: True if the value, or any
+#                    entry of it, is found; see internal.make_list_matcher)
+#    logic:          and  or  not  (and parentheses)
+#    keys:           name, name.sub.key, name["odd key"], name[0]
+#    values:         numbers, strings, True, False, None, and lists, tuples or
+#                    sets of those
+#
+# Comparisons use internal.do_op, so None and the str() fallback of EQUAL and
+# NOT_EQUAL behave as they do for eq, ne, gt, etc. A comparison involving a
+# key missing from the row is False, whatever the operator.
+#
+
+import ast
+import internal
+
+OPS = {
+    ast.Eq:    internal.EQUAL,
+    ast.NotEq: internal.NOT_EQUAL,
+    ast.Lt:    internal.LESS,
+    ast.LtE:   internal.LESSorEQUAL,
+    ast.Gt:    internal.GREATER,
+    ast.GtE:   internal.GREATERorEQUAL,
+}
+
+# the operator that gives the same result with the operands swapped
+SWAPPED = {
+    internal.EQUAL:          internal.EQUAL,
+    internal.NOT_EQUAL:      internal.NOT_EQUAL,
+    internal.LESS:           internal.GREATER,
+    internal.LESSorEQUAL:    internal.GREATERorEQUAL,
+    internal.GREATER:        internal.LESS,
+    internal.GREATERorEQUAL: internal.LESSorEQUAL,
+}
+
+LITERAL_NAMES = {"None": None, "True": True, "False": False}
+
+_compiled = {}
+
+def compile_expression(expression):
+    ''' returns the predicate for an expression; raises ValueError if the
+    expression can not be understood.
+    '''
+    try:
+        return _compiled[expression]
+    except KeyError:
+        pass
+    try:
+        tree = ast.parse(expression.strip(), mode="eval")
+    except SyntaxError as error:
+        raise ValueError("invalid expression {}: {}".format(repr(expression), error.msg))
+    predicate = compile_node(tree.body, expression)
+    internal.cache_compiled(_compiled, expression, predicate)
+    return predicate
+
+def node_key(node):
+    ''' returns the list of keys a node refers to, or None if it is not a key '''
+    if isinstance(node, ast.Name):
+        if node.id in LITERAL_NAMES:
+            return None
+        return [node.id]
+    if isinstance(node, ast.Attribute):
+        path = node_key(node.value)
+        if path is not None:
+            return path + [node.attr]
+        return None
+    if isinstance(node, ast.Subscript) and isinstance(node.slice, ast.Index):
+        path = node_key(node.value)
+        if path is not None:
+            try:
+                return path + [ast.literal_eval(node.slice.value)]
+            except ValueError:
+                return None
+    return None
+
+def compile_operand(node, expression):
+    ''' returns (True, value) for a literal or (False, crawl) for a key '''
+    path = node_key(node)
+    if path is not None:
+        if len(path)==1:
+            return (False, internal.compile_key(path[0]))
+        return (False, internal.compile_key(path))
+    try:
+        return (True, ast.literal_eval(node))
+    except ValueError:
+        raise ValueError("unsupported term in expression {}: {}".format(repr(expression), ast.dump(node)))
+
+def compile_compare(left, node_op, right, expression):
+    (left_literal, left_value) = left
+    (right_literal, right_value) = right
+    node_type = type(node_op)
+    if not (node_type in OPS or node_type in (ast.In, ast.NotIn)):
+        raise ValueError("unsupported comparison in expression {}: {}".format(repr(expression), node_type.__name__))
+    if left_literal and right_literal:
+        if node_type in OPS:
+            result = bool(internal.do_op(left_value, OPS[node_type], right_value))
+        else:
+            result = internal.make_list_matcher(right_value)(left_value)!=(node_type is ast.NotIn)
+        return lambda row: result
+    if left_literal or right_literal:
+        # one key against a literal: the comparison (or ValueSet) is made once
+        if right_literal:
+            (crawl, value) = (left_value, right_value)
+            if node_type in OPS:
+                check = internal.make_comparator(OPS[node_type], value)
+        else:
+            (crawl, value) = (right_value, left_value)
+            if node_type in OPS:
+                check = internal.make_comparator(SWAPPED[OPS[node_type]], value)
+        if node_type is ast.In:
+            check = internal.make_list_matcher(value)
+        elif node_type is ast.NotIn:
+            contained = internal.make_list_matcher(value)
+            check = lambda field: not contained(field)
+        def test(row):
+            (target, tkey, field) = crawl(row)
+            return target is not None and check(field)
+        return test
+    if node_type in OPS:
+        op = OPS[node_type]
+        do_op = internal.do_op
+        match = lambda field, value: do_op(field, op, value)
+    elif node_type is ast.In:
+        match = lambda field, value: internal.make_list_matcher(value)(field)
+    else:
+        match = lambda field, value: not internal.make_list_matcher(value)(field)
+    left_crawl = left_value
+    right_crawl = right_value
+    def test(row):
+        (target, tkey, field) = left_crawl(row)
+        if target is None:
+            return False
+        (target, tkey, value) = right_crawl(row)
+        return target is not None and match(field, value)
+    return test
+
+def compile_node(node, expression):
+    if isinstance(node, ast.BoolOp):
+        tests = [compile_node(value, expression) for value in node.values]
+        if isinstance(node.op, ast.And):
+            def test(row):
+                for one_test in tests:
+                    if not one_test(row):
+                        return False
+                return True
+        else:
+            def test(row):
+                for one_test in tests:
+                    if one_test(row):
+                        return True
+                return False
+        return test
+    if isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.Not):
+        inner = compile_node(node.operand, expression)
+        return lambda row: not inner(row)
+    if isinstance(node, ast.Compare):
+        operands = [compile_operand(one, expression) for one in [node.left] + node.comparators]
+        tests = [compile_compare(operands[pos], node_op, operands[pos+1], expression) for (pos, node_op) in enumerate(node.ops)]
+        if len(tests)==1:
+            return tests[0]
+        def test(row):
+            for one_test in tests:
+                if not one_test(row):
+                    return False
+            return True
+        return test
+    (literal, value) = compile_operand(node, expression)
+    if literal:
+        result = bool(value)
+        return lambda row: result
+    crawl = value
+    def test(row):
+        (target, tkey, field) = crawl(row)
+        return target is not None and bool(field)
+    return test
@@ -0,0 +1,99 @@
+# PLOD\hooks.py
+#
+# Pythonic List of Dictionary module/class (PLOD)
+#
+# INSTRUMENTATION SUPPORT ROUTINES
+#
+# The public PLOD methods are wrapped with 'instrumented'. When a hook has been
+# added (see PLOD.addHook and PLOD.addGlobalHook) each call is timed and
+# reported to the hooks as a dictionary:
+#
+#    {"operation": "gt", "args": ("age", 18), "kwargs": {},
+#     "rows_in": 4, "rows_out": 3, "seconds": 0.0000123}
+#
+# When no hook has been added, the wrapper does nothing but check for them.
+# Only the outermost call is reported; methods that call other methods (such
+# as returnCSV) are reported once.
+#
+# The wrapper also points internal.active_slow_paths at the counters of an
+# instance that tracks its slow paths (see PLOD.trackSlowPaths) for the
+# length of the call.
+#
+
+import internal
+import functools
+from timeit import default_timer
+
+# hooks reported to by every PLOD instance
+global_hooks = []
+
+def instrumented(method):
+    name = method.__name__
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        if self._hook_depth or not (self._hooks or global_hooks or self._slow_paths is not None):
+            return method(self, *args, **kwargs)
+        rows_in = self._known_count()
+        previous = internal.active_slow_paths
+        if self._slow_paths is not None:
+            internal.active_slow_paths = self._slow_paths
+        self._hook_depth += 1
+        try:
+            start = default_timer()
+            result = method(self, *args, **kwargs)
+            seconds = default_timer() - start
+        finally:
+            self._hook_depth -= 1
+            internal.active_slow_paths = previous
+        if not (self._hooks or global_hooks):
+            return result
+        record = {
+            "operation": name,
+            "args": args,
+            "kwargs": kwargs,
+            "rows_in": rows_in,
+            "rows_out": self._known_count(),
+            "seconds": seconds,
+        }
+        for hook in self._hooks + global_hooks:
+            hook(record)
+        return result
+    return wrapper
+
+def describe(record, width=40):
+    ''' the operation of a record written as a call, cut to 'width' '''
+    params = [repr(arg) for arg in record["args"]]
+    params.extend("{}={}".format(key, repr(value)) for (key, value) in sorted(record["kwargs"].items()))
+    text = "{}({})".format(record["operation"], ", ".join(params))
+    if len(text)>width:
+        text = text[:width-3] + "..."
+    return text
+
+class OperationLog(object):
+    ''' a hook that keeps the record of every operation reported to it '''
+
+    def __init__(self):
+        self.records = []
+
+    def __call__(self, record):
+        self.records.append(record)
+
+    def clear(self):
+        del self.records[:]
+
+    def summary(self):
+        ''' returns a table of the operations, in the order run, and the total
+        time taken. A count of rows is blank where it is not yet known, such
+        as for a deferred filter.
+        '''
+        def count(value):
+            if value is None:
+                return ""
+            return value
+        lines = ["{:<40} {:>9} {:>9} {:>11}".format("operation", "rows in", "rows out", "seconds")]
+        total = 0.0
+        for record in self.records:
+            lines.append("{:<40} {:>9} {:>9} {:>11.6f}".format(describe(record), count(record["rows_in"]), count(record["rows_out"]), record["seconds"]))
+            total += record["seconds"]
+        lines.append("{:<40} {:>9} {:>9} {:>11.6f}".format("total", "", "", total))
+        return "\n".join(lines)
@@ -0,0 +1,411 @@
+# PLOD\indexes.py
+#
+# Pythonic List of Dictionary module/class (PLOD)
+#
+# INDEX SUPPORT ROUTINES
+#
+# An index maps the values found at one key to the *original* indices of the
+# rows (see PLOD.index_track). Because original indices do not change when
+# the list is filtered or sorted, an index stays valid across those
+# operations; rows that have since been removed are simply skipped when the
+# original indices are mapped back to current positions.
+#
+
+import internal
+import datetime
+import decimal
+from bisect import bisect_left, bisect_right
+from operator import itemgetter
+
+class KeyIndex(object):
+    ''' the bookkeeping shared by all of the index types: which original
+    indices have the key (and with what value) and which are missing it.
+    A subclass files each present value with _add_value/_remove_value.
+    '''
+
+    def __init__(self, key):
+        self.key = key
+        self.crawl = internal.compile_key(key)
+        self.values = {}      # original index -> value found
+        self.present = set()
+        self.missing = set()
+
+    def add(self, orig, row):
+        (target, tkey, value) = self.crawl(row)
+        if target is None:
+            self.missing.add(orig)
+            return
+        self.present.add(orig)
+        self.values[orig] = value
+        self._add_value(orig, value)
+
+    def build(self, entries):
+        ''' files every (original index, row) of 'entries' '''
+        for (orig, row) in entries:
+            self.add(orig, row)
+
+    def remove(self, orig):
+        self.missing.discard(orig)
+        if not orig in self.present:
+            return
+        self.present.discard(orig)
+        self._remove_value(orig, self.values.pop(orig))
+
+    def lookup(self, condition):
+        ''' returns the set of original indices passing the filter condition
+        (see internal.compile_condition), or None if this index can not
+        answer it.
+        '''
+        return None
+
+class HashIndex(KeyIndex):
+    ''' value -> original indices, answering EQUAL and NOT_EQUAL comparisons
+    with the same semantics as internal.do_op (including the str() fallback
+    for values of differing types).
+    '''
+
+    def __init__(self, key):
+        KeyIndex.__init__(self, key)
+        self.exact = {}       # value -> set of original indices
+        self.by_str = {}      # str(value) -> set of original indices
+        self.unhashable = set()
+
+    def _add_value(self, orig, value):
+        try:
+            hash(value)
+            usable = (value == value)  # a NaN is never equal, even to itself
+        except Exception:
+            usable = False
+        if usable:
+            self.exact.setdefault(value, set()).add(orig)
+        else:
+            self.unhashable.add(orig)
+        if value is not None:
+            try:
+                self.by_str.setdefault(str(value), set()).add(orig)
+            except Exception:
+                pass
+
+    def _remove_value(self, orig, value):
+        if orig in self.unhashable:
+            self.unhashable.discard(orig)
+        else:
+            self.exact[value].discard(orig)
+        if value is not None:
+            try:
+                self.by_str.get(str(value), set()).discard(orig)
+            except Exception:
+                pass
+
+    def equal(self, value):
+        ''' returns the set of original indices of the rows having the key with
+        a value EQUAL to 'value', or None if the value can not be hashed (or
+        is a NaN, which a hash lookup would match to itself).
+        '''
+        try:
+            if not value == value:
+                return None
+            result = set(self.exact.get(value, ()))
+        except Exception:
+            return None
+        if value is None:
+            return result
+        try:
+            str_value = str(value)
+        except Exception:
+            str_value = None
+        value_type = type(value)
+        for orig in self.by_str.get(str_value, ()):
+            if type(self.values[orig]) != value_type:
+                result.add(orig)
+        if self.unhashable:
+            compare = internal.make_comparator(internal.EQUAL, value)
+            for orig in self.unhashable:
+                if compare(self.values[orig]):
+                    result.add(orig)
+        return result
+
+    def not_equal(self, value):
+        ''' returns the set of original indices of the rows having the key with
+        a value NOT_EQUAL to 'value', or None if the value can not be hashed.
+        '''
+        result = self.equal(value)
+        if result is None or value is None:
+            # do_op treats None as equal to None for every operation.
+            return result
+        return self.present - self.exact.get(None, set()) - result
+
+    def lookup(self, condition):
+        (name, args) = condition
+        if name!="select":
+            return None
+        (key, op, value, includeMissing) = args
+        if op==internal.EQUAL:
+            result = self.equal(value)
+        elif op==internal.NOT_EQUAL:
+            result = self.not_equal(value)
+        else:
+            return None
+        if result is not None and includeMissing:
+            result |= self.missing
+        return result
+
+    def first_match(self, value):
+        ''' returns the original indices that internal.get_index would accept
+        as a match for 'value', or None if the value can not be hashed.
+        '''
+        result = self.equal(value)
+        if result is not None and value is None:
+            # a missing key is read as a value of None
+            result |= self.missing
+        return result
+
+# values of these families are totally ordered among themselves, so they
+# can be kept in a sorted list and searched with bisect. The numbers share
+# one family since they compare with each other by value.
+NUMBER_TYPES = set([int, long, float, bool])
+ORDERED_TYPES = set([str, unicode, datetime.datetime, datetime.date,
+                     datetime.time, datetime.timedelta, decimal.Decimal])
+
+def order_family(value):
+    ''' returns the family a value is sorted within, or None if it can not
+    be placed in a sorted list.
+    '''
+    value_type = type(value)
+    if value_type in NUMBER_TYPES:
+        if value != value:
+            return None # NaN
+        return "number"
+    if value_type in ORDERED_TYPES:
+        if value_type is decimal.Decimal and value.is_nan():
+            return None
+        return value_type
+    return None
+
+RANGE_SEARCH = {
+    internal.GREATER:        lambda keys, value: (bisect_right(keys, value), len(keys)),
+    internal.GREATERorEQUAL: lambda keys, value: (bisect_left(keys, value), len(keys)),
+    internal.LESS:           lambda keys, value: (0, bisect_left(keys, value)),
+    internal.LESSorEQUAL:    lambda keys, value: (0, bisect_right(keys, value)),
+}
+
+class SortedIndex(KeyIndex):
+    ''' sorted values -> original indices, answering the LESS, LESSorEQUAL,
+    GREATER and GREATERorEQUAL comparisons with bisect. The semantics of
+    internal.do_op are kept: a value of None only matches a value of None.
+    Values that can not be kept sorted (or that belong to another family
+    than the one searched) are compared one by one with do_op.
+    '''
+
+    def __init__(self, key):
+        KeyIndex.__init__(self, key)
+        self.families = {}    # family -> (sorted list of values, matching list of original indices)
+        self.nones = set()
+        self.unordered = set()
+        self.pending = None   # family -> [(value, orig), ...] while building
+
+    def build(self, entries):
+        ''' files every (original index, row) of 'entries', sorting the
+        values of each family once rather than inserting them one by one
+        '''
+        self.pending = {}
+        try:
+            KeyIndex.build(self, entries)
+            for (family, pairs) in self.pending.items():
+                (keys, origs) = self.families.setdefault(family, ([], []))
+                pairs.extend(zip(keys, origs))
+                pairs.sort(key=itemgetter(0))
+                keys[:] = [value for (value, orig) in pairs]
+                origs[:] = [orig for (value, orig) in pairs]
+        finally:
+            self.pending = None
+
+    def _add_value(self, orig, value):
+        if value is None:
+            self.nones.add(orig)
+            return
+        family = order_family(value)
+        if family is None:
+            self.unordered.add(orig)
+            return
+        if self.pending is not None:
+            self.pending.setdefault(family, []).append((value, orig))
+            return
+        (keys, origs) = self.families.setdefault(family, ([], []))
+        pos = bisect_right(keys, value)
+        keys.insert(pos, value)
+        origs.insert(pos, orig)
+
+    def _remove_value(self, orig, value):
+        if value is None:
+            self.nones.discard(orig)
+            return
+        family = order_family(value)
+        if family is None:
+            self.unordered.discard(orig)
+            return
+        (keys, origs) = self.families[family]
+        pos = bisect_left(keys, value)
+        while origs[pos]!=orig:
+            pos += 1
+        del keys[pos]
+        del origs[pos]
+
+    def lookup(self, condition):
+        (name, args) = condition
+        if name!="select":
+            return None
+        (key, op, value, includeMissing) = args
+        if not op in RANGE_SEARCH:
+            return None
+        if value is None:
+            result = set(self.nones)
+        else:
+            family = order_family(value)
+            if family is None:
+                return None
+            result = set()
+            compare = internal.make_comparator(op, value)
+            for (one_family, (keys, origs)) in self.families.items():
+                if one_family==family:
+                    (start, end) = RANGE_SEARCH[op](keys, value)
+                    result.update(origs[start:end])
+                else:
+                    for (pos, key_value) in enumerate(keys):
+                        if compare(key_value):
+                            result.add(origs[pos])
+            for orig in self.unordered:
+                if compare(self.values[orig]):
+                    result.add(orig)
+        if includeMissing:
+            result |= self.missing
+        return result
+
+# the containers whose entries an inverted index files; a value of another
+# kind that detect_list still accepts (a generator, say) is compared at
+# lookup time instead
+ENTRY_TYPES = set([list, tuple, set, frozenset, dict])
+
+class InvertedIndex(KeyIndex):
+    ''' entry -> original indices, for a key holding a list. It answers
+    contains: the rows for any of the values are the union of their entries'
+    sets, for all of them (findAll) the intersection, and exclude takes the
+    complement among the rows having the key. An entry matches a value as in
+    internal.ValueSet, so the str() fallback of EQUAL is kept. A value that
+    is not a list is filed as a list of one entry, as contains treats it.
+    '''
+
+    def __init__(self, key):
+        KeyIndex.__init__(self, key)
+        self.exact = {}       # entry -> set of original indices
+        self.by_str = {}      # str(entry) -> {type of entry: set of original indices}
+        self.entries = {}     # original index -> tuple of the entries filed
+        self.awkward = set()  # rows compared at lookup time
+
+    def _add_value(self, orig, value):
+        if not internal.detect_list(value):
+            entries = (value,)
+        elif type(value) in ENTRY_TYPES:
+            entries = tuple(value)
+        else:
+            self.awkward.add(orig)
+            return
+        for entry in entries:
+            try:
+                hash(entry)
+                usable = (entry == entry)  # a NaN is never equal, even to itself
+            except Exception:
+                usable = False
+            if not usable:
+                self.awkward.add(orig)
+                return
+        self.entries[orig] = entries
+        for entry in entries:
+            self.exact.setdefault(entry, set()).add(orig)
+            if entry is not None:
+                try:
+                    str_entry = str(entry)
+                except Exception:
+                    continue
+                self.by_str.setdefault(str_entry, {}).setdefault(type(entry), set()).add(orig)
+
+    def _remove_value(self, orig, value):
+        if orig in self.awkward:
+            self.awkward.discard(orig)
+            return
+        for entry in self.entries.pop(orig):
+            self.exact.get(entry, set()).discard(orig)
+            if entry is not None:
+                try:
+                    str_entry = str(entry)
+                except Exception:
+                    continue
+                self.by_str.get(str_entry, {}).get(type(entry), set()).discard(orig)
+
+    def equal(self, value):
+        ''' returns the set of original indices of the filed rows with an
+        entry EQUAL to 'value' '''
+        result = set(self.exact.get(value, ()))
+        if value is None:
+            return result
+        try:
+            by_type = self.by_str.get(str(value), {})
+        except Exception:
+            return result
+        value_type = type(value)
+        for (entry_type, origs) in by_type.items():
+            if entry_type is not value_type:
+                result |= origs
+        return result
+
+    def lookup(self, condition):
+        (name, args) = condition
+        if name!="contains":
+            return None
+        (key, value, findAll, exclude, includeMissing) = args
+        if internal.detect_list(value):
+            values = list(value)
+        else:
+            values = [value]
+        for one_value in values:
+            try:
+                hash(one_value)
+                if one_value != one_value:
+                    return None
+            except Exception:
+                return None
+        if findAll:
+            result = set(self.entries)
+            for one_value in values:
+                result &= self.equal(one_value)
+                if not result:
+                    break
+        else:
+            result = set()
+            for one_value in values:
+                result |= self.equal(one_value)
+        if self.awkward:
+            match = internal.make_list_matcher(values, findAll)
+            for orig in self.awkward:
+                if match(self.values[orig]):
+                    result.add(orig)
+        if exclude:
+            result = self.present - result
+        if includeMissing:
+            result |= self.missing
+        return result
+
+INDEX_TYPES = {
+    "hash": HashIndex,
+    "sorted": SortedIndex,
+    "inverted": InvertedIndex,
+}
+
+def index_name(key):
+    ''' the name an index for 'key' is filed under, or None if unhashable '''
+    try:
+        path = internal.key_path(key)
+        hash(path)
+    except TypeError:
+        return None
+    return path
@@ -6,7 +6,10 @@
 #
     
 import types as typemod
-from inspect import getmembers
+import sys
+import multiprocessing
+from array import array
+from inspect import getmembers, getmro
     
 NOOP = -1  # 'NOOP' aka 'no operation' essentially means "always true"
 LESS = 0
@@ -19,6 +22,25 @@ GREATER = 4
 NOT_EQUAL = 5
 NOTEQUAL = 5
 
+# Counts of the fallbacks that cost the most, for the whole process (see
+# PLOD.globalSlowPaths):
+#
+#    getmembers:   inspect.getmembers was called to look inside an object
+#    convert_copy: convert_to_dict had to build a new dictionary for a row
+#    str_compare:  an EQUAL/NOT_EQUAL comparison fell back to comparing str()s
+#
+# While a PLOD instance that tracks its own counts (see PLOD.trackSlowPaths)
+# runs an operation, active_slow_paths holds its counters so that they are
+# counted as well.
+SLOW_PATHS = ("getmembers", "convert_copy", "str_compare")
+slow_paths = dict.fromkeys(SLOW_PATHS, 0)
+active_slow_paths = None
+
+def count_slow_path(name):
+    slow_paths[name] += 1
+    if active_slow_paths is not None:
+        active_slow_paths[name] += 1
+
 def convert_to_dict(item):
     '''Examine an item of any type and return a true dictionary.
 
@@ -45,6 +67,7 @@ def convert_to_dict(item):
     if actual_type=="dict":
         return item
     elif actual_type=="list":
+        count_slow_path("convert_copy")
         temp = {}
         ctr = 0
         for entry in item:
@@ -57,11 +80,31 @@ def convert_to_dict(item):
         return item.__dict__
     elif actual_type=="iterable_dict":
         # for a 'iterable_dict' create a real dictionary for a ALMOST-dict object.
+        count_slow_path("convert_copy")
         d = {}
         for key in item: # NO, you can't use iteritems(). The method might not exist.
             d[key] = item[key]
         return d
-    elif actual_type=="object":
+    elif actual_type=="object" or actual_type=="record":
+        count_slow_path("convert_copy")
+        plan = attribute_plan(row_class(item))
+        if plan is not None:
+            (fields, read_dict) = plan
+            if actual_type=="record":
+                if isinstance(item, tuple) and fields==getattr(item, '_fields', None):
+                    return dict(zip(fields, item)) # a namedtuple
+                d = {}
+            elif read_dict:
+                d = dict(getattr(item, '__dict__', ()))
+            else:
+                d = {}
+            for key in fields:
+                try:
+                    d[key] = getattr(item, key)
+                except AttributeError:
+                    pass # an empty slot
+            return d
+        count_slow_path("getmembers")
         tuples = getmembers(item)
         d = {}
         for (key, value) in tuples:
@@ -69,56 +112,170 @@ def convert_to_dict(item):
         return d
     return {}
 
+# the classification of a row depends almost entirely on its class, so
+# the expensive part of detect_type is done once per class and cached here.
+_type_cache = {}
+_member_cache = {}
+
+def _classify(item):
+    ''' returns how detect_type should treat instances of the item's class:
+    'record' (a namedtuple, or an object read through its attribute plan),
+    'dict', 'list', 'probe' (iterable; test the first key of each row),
+    'attributes', 'mongo_attributes' (has a __dict__) or 'members'.
+    '''
+    item_class = row_class(item)
+    if isinstance(item, tuple) and hasattr(item_class, '_fields'):
+        return "record"
+    plan = attribute_plan(item_class)
+    if plan is not None:
+        if not plan[1]:
+            # registered with its fields
+            return "record"
+        if not hasattr(item, '__iter__') and not hasattr(item, '__dict__'):
+            return "record"
+    if hasattr(item, '__iter__'):
+        if hasattr(item, '__getitem__'):
+            # a class supporting the full dict protocol is a dict, even when
+            # a particular (empty) row has no first key to probe.
+            for method in ('__contains__', '__delitem__', 'iteritems', 'iterkeys', '__len__'):
+                if not hasattr(item, method):
+                    return "probe"
+            return "dict"
+        return "list"
+    if hasattr(item, '__dict__'):
+        try:
+            if "mongoengine.base" in str(item.__metaclass__):
+                return "mongo_attributes"
+        except:
+            pass
+        return "attributes"
+    return "members"
+
+def _member_type(item_class, item):
+    try:
+        return _member_cache[item_class]
+    except KeyError:
+        pass
+    result = "unknown"
+    count_slow_path("getmembers")
+    try:
+        if getmembers(item):
+            result = "object"
+    except Exception:
+        pass
+    _member_cache[item_class] = result
+    return result
+
+# Attribute plans
+#
+# A 'record' row (a namedtuple, or an object without a __dict__ such as an
+# instance of a class with __slots__) is read through the plan of its class:
+# the __slots__ of the class and of its bases, the _fields of a namedtuple
+# and the fields of a dataclass (or attrs) class. Its keys are those
+# attributes, read directly with getattr. A class registered with
+# register_row_type (see PLOD.registerRowType) is always read this way, with
+# the fields given or, optionally, its properties as well. The plan is made
+# once per class; an unregistered class without __slots__ or _fields has no
+# plan and falls back to inspect.getmembers.
+
+_row_types = {}   # class -> (fields or None, properties) as registered
+_plans = {}       # class -> tuple of attribute names, or None
+
+def row_class(item):
+    item_class = type(item)
+    if item_class is typemod.InstanceType:
+        return item.__class__
+    return item_class
+
+def register_row_type(item_class, fields=None, properties=False):
+    if fields is not None:
+        fields = tuple(fields)
+    _row_types[item_class] = (fields, properties)
+    _plans.pop(item_class, None)
+    _type_cache.pop(item_class, None)
+    # the accessors specialised for the class are out of date
+    for accessors in _accessor_caches:
+        accessors.pop(item_class, None)
+
+def attribute_plan(item_class):
+    ''' returns the plan for the rows of the class, (fields, read_dict):
+    the tuple of the data attributes to read and whether the __dict__ of the
+    row is read as well. Returns None if the class has no plan.
+    '''
+    try:
+        return _plans[item_class]
+    except KeyError:
+        pass
+    (fields, properties) = _row_types.get(item_class, (None, False))
+    read_dict = fields is None
+    if read_dict:
+        fields = []
+        for klass in reversed(getmro(item_class)):
+            slots = klass.__dict__.get('__slots__', ())
+            if isinstance(slots, basestring):
+                slots = [slots]
+            for name in slots:
+                if name in ('__dict__', '__weakref__'):
+                    continue
+                if name.startswith('__') and not name.endswith('__'):
+                    name = '_' + klass.__name__.lstrip('_') + name # mangled
+                fields.append(name)
+            fields.extend(klass.__dict__.get('_fields', ()))
+            fields.extend(sorted(klass.__dict__.get('__dataclass_fields__', ())))
+            fields.extend(attribute.name for attribute in klass.__dict__.get('__attrs_attrs__', ()))
+            if properties:
+                fields.extend(sorted(name for (name, value) in klass.__dict__.items() if isinstance(value, property)))
+        seen = set()
+        fields = tuple(name for name in fields if not (name in seen or seen.add(name)))
+    if fields or item_class in _row_types:
+        plan = (fields, read_dict)
+    else:
+        plan = None
+    _plans[item_class] = plan
+    return plan
+
 # perhaps we should detect less and demand a parameter about type?
 def detect_type(item):
     # possible return values:
-    # 'dict', 'list', 'mongoengine'(legacy), 'class', 'object'
-    # or 'unknown'
-    if type(item) is typemod.DictType:
+    # 'dict', 'list', 'record', 'iterable_dict', 'mongoengine'(legacy),
+    # 'class', 'object' or 'unknown'
+    item_class = type(item)
+    if item_class is typemod.DictType:
         return "dict"
-    if type(item) is typemod.ListType:
+    if item_class is typemod.ListType:
         return "list"
-    # try to iterate
-    if hasattr(item, '__iter__'):
-        type_so_far = "list"
-        if hasattr(item, '__getitem__'):
-            try:
-                first_key = item.__iter__().next()
-                first_value = item.__getitem__(first_key)
-                type_so_far = "iterable_dict"
-                # we now know we have a basic dict. But does it fully support
-                # the dict class methods?
-                if hasattr(item, '__contains__'):
-                    if hasattr(item, '__delitem__'):
-                        if hasattr(item, 'iteritems'):
-                            if hasattr(item, 'iterkeys'):
-                                if hasattr(item, '__len__'):
-                                    type_so_far = "dict"
-            except Exception:
-                pass
-        return type_so_far
-    # try a 'class-like' __dict__
+    if item_class is typemod.InstanceType:
+        item_class = item.__class__
     try:
-        temp = item.__dict__
-    except AttributeError:
-        temp = False
-    if temp:
-        # but first try for a legacy mongoengine
-        if '_data' in temp:
-            try:
-                if "mongoengine.base" in str(item.__metaclass__):
-                    return "mongoengine"
-            except:
-                pass
-        return "class"
+        kind = _type_cache[item_class]
+    except KeyError:
+        kind = _classify(item)
+        if item_class in _row_types and kind!="record":
+            kind = "registered"
+        _type_cache[item_class] = kind
+    if kind=="dict" or kind=="list" or kind=="record":
+        return kind
+    if kind=="registered":
+        return "object"
+    if kind=="probe":
+        try:
+            first_key = item.__iter__().next()
+            item.__getitem__(first_key)
+            return "iterable_dict"
+        except Exception:
+            return "list"
+    if kind!="members":
+        # try a 'class-like' __dict__
+        try:
+            temp = item.__dict__
+        except AttributeError:
+            temp = False
+        if temp:
+            if kind=="mongo_attributes" and '_data' in temp:
+                return "mongoengine"
+            return "class"
     # try to grab the members of a generic object
-    try:
-        tuples = getmembers(item)
-        if tuples:
-            return "object"
-    except Exception:
-        pass
-    return "unknown"
+    return _member_type(item_class, item)
 
 def detect_list(something):
     if type(something) is typemod.ListType:
@@ -127,88 +284,211 @@ def detect_list(something):
         return True
     return False
 
-def make_list(something):
-    if detect_list(something):
-        return something
-    return [something]
+NOT_FOUND = (None, None, None)
+
+def key_path(key):
+    ''' returns a key (or cascading list of keys) as a tuple of keys '''
+    if detect_list(key):
+        return tuple(key)
+    return (key,)
+
+def is_list_index(container, key):
+    ''' a list is interpreted as a dictionary keyed by index position '''
+    if type(key) in (typemod.IntType, typemod.LongType, typemod.BooleanType):
+        return 0 <= key < len(container)
+    return False
 
-def dict_crawl(entry, key):
-    ''' returns a triple tuple representing the location of the key/key-list.
-    returns: (parent_dictionary, final_key, value_found)
-    If unable to locate the key, then (None, None, None) is returned.
+def crawl_path(entry, path, top=True):
+    ''' the uncompiled crawl of a row along a tuple of keys.
+    returns: (parent, final_key, value_found) where parent is the dictionary
+    (or object) holding the final key. If unable to locate the key, then
+    NOT_FOUND, aka (None, None, None), is returned.
     '''
-    value = None
-    key_list = make_list(key)
+    if not path:
+        return NOT_FOUND
     try:
-        result = None
-        success_flag = True
         temp = entry
-        for next_key in key_list:
-            parent = temp
+        for next_key in path:
             actual_type = detect_type(temp)
-            if actual_type=="mongoengine":
-                if next_key in temp.__dict__['_data']:
-                    temp = temp.__dict__['_data'][next_key]
-                else:
-                    break
+            if actual_type=="dict":
+                parent = temp
+                if not next_key in parent:
+                    return NOT_FOUND
             elif actual_type=="class":
-                if next_key in temp.__dict__:
-                    temp = temp.__dict__[next_key]
-                else:
-                    break
-            elif actual_type=="dict":
-                if next_key in temp:
-                    temp = temp[next_key]
-                else:
-                    break
+                parent = temp.__dict__
+                if not next_key in parent:
+                    return NOT_FOUND
+            elif actual_type=="mongoengine":
+                parent = temp.__dict__['_data']
+                if not next_key in parent:
+                    return NOT_FOUND
             elif actual_type=="iterable_dict":
-                if next_key in convert_to_dict(temp): # 'contains' method might not be there
-                    temp = temp[next_key]
-                else:
-                    break
+                parent = temp
+                # 'in' falls back to iterating the keys when the object has
+                # no __contains__ method, without copying it to a dictionary
+                if not next_key in temp:
+                    return NOT_FOUND
             elif actual_type=="list":
-                if next_key in temp:
-                    temp = temp[next_key]
-                else:
-                    break
-            else:  ## I'm unsure we can really 'crawl' an 'object'
-                break
+                parent = temp
+                if not is_list_index(parent, next_key):
+                    return NOT_FOUND
+            elif actual_type=="record":
+                parent = temp
+                if next_key in attribute_plan(row_class(temp))[0]:
+                    temp = getattr(temp, next_key) # AttributeError if the slot is empty
+                    top = False
+                    continue
+                # a namedtuple can still be read by index position
+                if not (isinstance(temp, tuple) and is_list_index(temp, next_key)):
+                    return NOT_FOUND
+            elif actual_type=="object" and top:
+                # only the row itself is read by attribute; a nested 'object'
+                # is a plain value such as a string or a number.
+                if not isinstance(next_key, basestring) or not hasattr(temp, next_key):
+                    return NOT_FOUND
+                parent = temp
+                temp = getattr(temp, next_key)
+                top = False
+                continue
+            else:
+                return NOT_FOUND
+            temp = parent[next_key]
+            top = False
+        return (parent, next_key, temp)
+    except Exception:
+        pass
+    return NOT_FOUND
+
+def _build_accessor(path, row):
+    ''' returns a crawl function specialised for rows of the same class as
+    'row'. A plain dictionary row (or the __dict__ of an object) gets a
+    direct lookup of the first key, and a record row (see attribute_plan) a
+    direct read of the attribute.
+    '''
+    if type(row) is not typemod.InstanceType and detect_type(row)=="record":
+        first = path[0]
+        if first in attribute_plan(type(row))[0]:
+            rest = path[1:]
+            def access(row):
+                try:
+                    value = getattr(row, first)
+                except AttributeError:
+                    return NOT_FOUND # an empty slot
+                if rest:
+                    return crawl_path(value, rest, top=False)
+                return (row, first, value)
+            return access
+        return lambda row: crawl_path(row, path)
+    if type(row) is not typemod.InstanceType and detect_type(row)=="class" and _type_cache.get(type(row))=="attributes":
+        # an object with a __dict__, such as a dataclass-style row; a row
+        # without the key (or with an empty __dict__) takes the usual path
+        first = path[0]
+        try:
+            hash(first)
+        except TypeError:
+            return lambda row: crawl_path(row, path)
+        rest = path[1:]
+        def access(row):
+            attributes = row.__dict__
+            if first in attributes:
+                if rest:
+                    return crawl_path(attributes[first], rest, top=False)
+                return (attributes, first, attributes[first])
+            return crawl_path(row, path)
+        return access
+    if type(row) is typemod.DictType:
+        first = path[0]
+        try:
+            hash(first)
+        except TypeError:
+            return lambda row: crawl_path(row, path)
+        if len(path)==1:
+            def access(row):
+                if first in row:
+                    return (row, first, row[first])
+                return NOT_FOUND
         else:
-            return (parent, key_list[-1], temp)
-        return (None, None, None)
-    except:
+            rest = path[1:]
+            def access(row):
+                if first in row:
+                    return crawl_path(row[first], rest, top=False)
+                return NOT_FOUND
+        return access
+    return lambda row: crawl_path(row, path)
+
+# the most predicates a cache of compiled queries (see queries.py and
+# expressions.py) keeps. Queries carry their values, so a program querying by
+# many different values would otherwise keep one predicate for each forever.
+COMPILED_CACHE_SIZE = 256
+
+def cache_compiled(cache, key, predicate):
+    ''' files a compiled predicate in 'cache', emptying the cache first if it
+    already holds COMPILED_CACHE_SIZE of them.
+    '''
+    if len(cache)>=COMPILED_CACHE_SIZE:
+        cache.clear()
+    cache[key] = predicate
+
+_compiled_keys = {}
+_accessor_caches = []
+
+def compile_key(key):
+    ''' returns a function that crawls a row for the key (or cascading list
+    of keys) and returns (parent, final_key, value_found) or NOT_FOUND.
+
+    The function is compiled once per key and caches a specialised accessor
+    per row class. A string key containing dots, such as "zip.zap", that is
+    not found literally is also tried as the key list ["zip", "zap"].
+    '''
+    path = key_path(key)
+    try:
+        return _compiled_keys[path]
+    except KeyError:
         pass
-    return (None, None, None)
+    except TypeError:
+        # an unhashable key can not be cached
+        return lambda row: crawl_path(row, path)
+    accessors = {}
+    _accessor_caches.append(accessors)
+    def crawl_literal(row):
+        row_class = type(row)
+        try:
+            access = accessors[row_class]
+        except KeyError:
+            access = _build_accessor(path, row)
+            accessors[row_class] = access
+        return access(row)
+    crawl = crawl_literal
+    if len(path)==1 and isinstance(path[0], basestring) and '.' in path[0]:
+        crawl_dotted = compile_key(path[0].split('.'))
+        def crawl(row):
+            result = crawl_literal(row)
+            if result[0] is None:
+                return crawl_dotted(row)
+            return result
+    _compiled_keys[path] = crawl
+    return crawl
 
-def modify_member(row, key, value):
-    ''' properly modifies a dict or class attribute '''
-    (target, tkey, tvalue) = dict_crawl(row, key)
-    if target:
+def set_at(target, tkey, value):
+    ''' sets a key of a dictionary, or the attribute of an object '''
+    try:
         target[tkey] = value
-    return row
+    except TypeError:
+        try:
+            setattr(target, tkey, value)
+        except Exception:
+            pass
 
-def remove_member(row, key):
-    ''' properly modifies a dict or class attribute '''
-    (target, tkey, tvalue) = dict_crawl(row, key)
-    if target:
+def delete_at(target, tkey):
+    ''' removes a key of a dictionary, or the attribute of an object '''
+    try:
         del target[tkey]
-    return row
-
-def detect_member(row, key):
-    ''' properly detects if a an attribute exists '''
-    (target, tkey, tvalue) = dict_crawl(row, key)
-    if target:
-        return True
-    return False
-
-def get_member(row, key):
-    ''' properly detects if a an attribute exists '''
-    (target, tkey, tvalue) = dict_crawl(row, key)
-    if target:
-        return tvalue
-    return None
+    except TypeError:
+        try:
+            delattr(target, tkey)
+        except Exception:
+            pass
 
-    
 def do_op(field, op, value):
     ''' used for comparisons '''
     if op==NOOP:
@@ -237,6 +517,7 @@ def do_op(field, op, value):
             return True
         if type(field)==type(value):
             return False
+        count_slow_path("str_compare")
         try:
             field = str(field)
             value = str(value)
@@ -252,6 +533,7 @@ def do_op(field, op, value):
             return False
         if type(field)==type(value):
             return True
+        count_slow_path("str_compare")
         try:
             field = str(field)
             value = str(value)
@@ -260,6 +542,95 @@ def do_op(field, op, value):
             return True
     return False        
     
+# make_comparator builds, once per (op, value), a function of the field alone
+# that returns the same result as do_op(field, op, value). The branches of
+# do_op that depend only on the op and value are decided in advance, and the
+# str() of the value used by the EQUAL/NOT_EQUAL fallback is made only once.
+
+def _compare_less(value):
+    return lambda field: field is not None and (field < value)
+
+def _compare_less_or_equal(value):
+    return lambda field: field is not None and (field <= value)
+
+def _compare_greater_or_equal(value):
+    return lambda field: field is not None and (field >= value)
+
+def _compare_greater(value):
+    return lambda field: field is not None and (field > value)
+
+def _str_of(value):
+    try:
+        return (True, str(value))
+    except:
+        return (False, None)
+
+def _compare_equal(value):
+    value_type = type(value)
+    (str_ok, str_value) = _str_of(value)
+    def compare(field):
+        if field is None:
+            return False
+        if field == value:
+            return True
+        if type(field) is value_type:
+            return False
+        count_slow_path("str_compare")
+        if not str_ok:
+            return False
+        try:
+            return str(field) == str_value
+        except:
+            return False
+    return compare
+
+def _compare_not_equal(value):
+    value_type = type(value)
+    (str_ok, str_value) = _str_of(value)
+    def compare(field):
+        if field is None:
+            return False
+        if field == value:
+            return False
+        if type(field) is value_type:
+            return True
+        count_slow_path("str_compare")
+        if not str_ok:
+            return True
+        try:
+            return str(field) != str_value
+        except:
+            return True
+    return compare
+
+COMPARATORS = {
+    LESS:           _compare_less,
+    LESSorEQUAL:    _compare_less_or_equal,
+    EQUAL:          _compare_equal,
+    GREATERorEQUAL: _compare_greater_or_equal,
+    GREATER:        _compare_greater,
+    NOT_EQUAL:      _compare_not_equal,
+}
+
+def _always(field):
+    return True
+
+def _never(field):
+    return False
+
+def _is_none(field):
+    return field is None
+
+def make_comparator(op, value):
+    ''' returns a function 'compare(field)' equal to do_op(field, op, value) '''
+    if op==NOOP:
+        return _always
+    if value==None:
+        return _is_none
+    if op in COMPARATORS:
+        return COMPARATORS[op](value)
+    return _never
+
 def get_index(table, field_name, op, value):
     ''' 
     Returns the index of the first list entry that matches. If no matches
@@ -268,10 +639,11 @@ def get_index(table, field_name, op, value):
     NOTE: both 'None' and 0 evaluate as False in python. So, if you are checking for a
        None being returned, be explicit. "if myindex==None:" not simply "if not myindex:"
     '''
+    crawl = compile_key(field_name)
+    compare = make_comparator(op, value)
     counter = 0
     for row in table:
-        dict_row = convert_to_dict(row)
-        if do_op(dict_row.get(field_name, None), op, value):
+        if compare(crawl(row)[2]):
             return counter
         counter += 1
     return None
@@ -281,176 +653,466 @@ def get_value(row, field_name):
     '''
     Returns the value found in the field_name attribute of the row dictionary.
     '''
-    result = None
-    dict_row = convert_to_dict(row)
-    if detect_list(field_name):
-        temp = row
-        for field in field_name:
-            dict_temp = convert_to_dict(temp)
-            temp = dict_temp.get(field, None)
-        result = temp
-    else:
-        result = dict_row.get(field_name, None)
-    return result
+    return compile_key(field_name)(row)[2]
     
-def detect_fields(field_name, row):
-    if detect_list(field_name):
-        ptr = row
-        for field in field_name:
-            # print field, repr(ptr)
-            if field in ptr:
-                ptr = ptr[field]
-            else:
-                return False
-        return True
-    else:
-        if field_name in row:
-            return True
-    return False
+#
+# Row tests
+#
+# A filter is described by a 'condition': a (name, args) tuple such as
+# ("select", (key, op, value, includeMissing)). compile_condition turns it
+# into a test function of one row. Conditions are plain data so that a list
+# of them can be recorded as a query plan and run later in one fused pass.
+#
 
+def select_test(field_name, op, value, includeMissing):
+    crawl = compile_key(field_name)
+    compare = make_comparator(op, value)
+    def test(row):
+        (target, tkey, final_value) = crawl(row)
+        if target is not None:
+            return compare(final_value)
+        return includeMissing
+    return test
 
-def select(table, index_track, field_name, op, value, includeMissing):
-    '''Modifies the table and index_track lists based on the comparison.
+def has_key_test(field_name, notNone):
+    crawl = compile_key(field_name)
+    def test(row):
+        (target, tkey, final_value) = crawl(row)
+        if target is not None:
+            return notNone==False or not final_value is None
+        return False
+    return test
+
+def missing_key_test(field_name, notNone):
+    crawl = compile_key(field_name)
+    def test(row):
+        (target, tkey, final_value) = crawl(row)
+        return (target is None) or (notNone and (final_value is None))
+    return test
+
+def contains_test(field_name, value, findAll, exclude, includeMissing):
+    crawl = compile_key(field_name)
+    match = make_list_matcher(value, findAll)
+    def test(row):
+        (target, tkey, target_list) = crawl(row)
+        if target is not None:
+            success = match(target_list)
+            if exclude:
+                success = not success
+            return success
+        return includeMissing
+    return test
+
+def where_test(expression):
+    import expressions
+    return expressions.compile_expression(expression)
+
+def find_test(document):
+    import queries
+    return queries.compile_query(document)
+
+TESTS = {
+    "select": select_test,
+    "has_key": has_key_test,
+    "missing_key": missing_key_test,
+    "contains": contains_test,
+    "where": where_test,
+    "find": find_test,
+}
+
+def compile_condition(condition):
+    (name, args) = condition
+    return TESTS[name](*args)
+
+def filter_stream(source, tests):
+    '''Returns the (table, index_track, count) of the rows read from the
+    'source' iterator that pass every test. Only the passing rows are kept;
+    'count' is the number of rows read.
     '''
     result = []
-    result_index = []
+    result_index = array('l')
     counter = 0
-    for row in table:
-        if detect_fields(field_name, convert_to_dict(row)):
-            final_value = get_value(row, field_name)
-            if do_op(final_value, op, value):
-                result.append(row)
-                result_index.append(index_track[counter])
+    for row in source:
+        for test in tests:
+            if not test(row):
+                break
         else:
-            if includeMissing:
-                result.append(row)
-                result_index.append(index_track[counter])
+            result.append(row)
+            result_index.append(counter)
+        counter += 1
+    return (result, result_index, counter)
+
+def filter_positions(rows, positions, tests):
+    '''Returns the array of those 'positions' whose rows pass every test.
+    All of the tests are applied in a single pass; the rows are not copied.
+    '''
+    result = array('l')
+    for pos in positions:
+        row = rows[pos]
+        for test in tests:
+            if not test(row):
+                break
+        else:
+            result.append(pos)
+    return result
+
+# the (rows, positions, conditions) being filtered by parallel_positions; the
+# worker processes inherit it when they are forked rather than having it
+# pickled.
+_parallel_work = None
+
+def filter_chunk(bounds):
+    '''Run in a worker process by parallel_positions. Returns those of the
+    positions between the 'bounds' (start, end) whose rows pass every
+    condition.
+    '''
+    (rows, positions, conditions) = _parallel_work
+    tests = [compile_condition(condition) for condition in conditions]
+    result = []
+    for counter in xrange(*bounds):
+        pos = positions[counter]
+        row = rows[pos]
+        for test in tests:
+            if not test(row):
+                break
+        else:
+            result.append(pos)
+    return result
+
+def parallel_positions(rows, positions, conditions, processes, chunk_size):
+    '''Returns the array of those 'positions' whose rows pass every
+    condition, as filter_positions does, but with the positions split into
+    chunks that are tested in a pool of worker processes. The chunks are
+    merged back in their original order, so the result is the same as the
+    serial one.
+
+    The workers read the rows from the memory they share with this process
+    when forked, so nothing but positions is passed between them. Returns
+    None where processes can not be forked (Windows).
+    '''
+    global _parallel_work
+    if sys.platform=="win32":
+        return None
+    length = len(positions)
+    chunks = [(start, min(start+chunk_size, length)) for start in xrange(0, length, chunk_size)]
+    _parallel_work = (rows, positions, conditions)
+    try:
+        pool = multiprocessing.Pool(processes)
+        try:
+            found = pool.map(filter_chunk, chunks, 1)
+        finally:
+            pool.close()
+            pool.join()
+    finally:
+        _parallel_work = None
+    result = array('l')
+    for kept in found:
+        result.extend(kept)
+    return result
+
+def remove_indices(table, index_track, remove):
+    '''Returns the (table, index_track) pair without the rows whose original
+    index is in the 'remove' set.
+    '''
+    result = []
+    result_index = array('l')
+    counter = 0
+    for row in table:
+        orig = index_track[counter]
+        if not orig in remove:
+            result.append(row)
+            result_index.append(orig)
         counter += 1
-    #table = result
-    #index_track = result_index
     return (result, result_index)
 
-def compare_by_key(row_one, row_two, key_field, none_greater=False, reverse=False):
-    # LESS = 0
-    # EQUAL = 2
-    # GREATER = 4
-    # 
-    value_one = get_value(row_one, key_field)
-    value_two = get_value(row_two, key_field)
-    missing_one_flag = not value_one
-    missing_two_flag = not value_two
-    if missing_one_flag and missing_two_flag:
-        result = EQUAL
+def sort_key(row, crawls, none_greater=False):
+    ''' returns a tuple that orders the row for PLOD.sort. 'crawls' is the
+    list of compiled keys (see compile_key) to sort by.
+    Each key contributes (1, value); a missing (or false) value contributes
+    (0,) so that it sorts first, or (2,) if none_greater is set.
+    '''
+    if none_greater:
+        missing = (2,)
     else:
-        if missing_one_flag:
-            if none_greater:
-                result = GREATER
-            else:
-                result = LESS
+        missing = (0,)
+    result = []
+    for crawl in crawls:
+        value = crawl(row)[2]
+        if value:
+            result.append((1, value))
         else:
-            if missing_two_flag:
-                if none_greater:
-                    result = LESS
-                else:
-                    result = GREATER
-            else:
-                if value_one < value_two:
-                    result = LESS
-                elif value_one > value_two:
-                    result = GREATER
-                else:
-                    result = EQUAL
-    if reverse:
-        if result==GREATER:
-            result = LESS
-        elif result==LESS:
-            result = GREATER
-    return result
+            result.append(missing)
+    return tuple(result)
+
+def sort_order(table, key_field, none_greater=False, reverse=False):
+    ''' returns the list of positions that puts the table into sorted order.
 
-def is_first_lessor(row_one, row_two, key_field, none_greater=False, reverse=False):
-    # if not a list, make it one.
+    The key of each row is pulled exactly once and the positions are then
+    arranged with the (stable) built-in sort. Rows with equal keys keep their
+    original order, whether or not the sort is reversed.
+    '''
     if not type(key_field) is list:
         key_field = [key_field]
-    #
-    # roam the list until a non-equal condition found (or the list ends)
-    for one_key in key_field:
-        result = compare_by_key(row_one, row_two, one_key, none_greater=none_greater, reverse=reverse)
-        if result != EQUAL:
-            break
-    #
-    if result==LESS:
-        return True
-    # this subtle difference here is what makes the sorting
-    # algorithm "stable". that is, it only sorts values if a
-    # difference is seen, otherwise original order is left
-    # intact. (a reversed '<=' is a '>')
-    if (result==EQUAL):
-        return reverse
-    return False
+    crawls = [compile_key(one_key) for one_key in key_field]
+    keys = [sort_key(row, crawls, none_greater) for row in table]
+    return sorted(range(len(keys)), key=keys.__getitem__, reverse=reverse)
 
 
-def list_match_any(source, value):
-    if detect_list(source):
-        for sub_source in source:
-            if detect_list(value):
-                # list vs list
-                for sub_val in value:
-                    if do_op(sub_source, EQUAL, sub_val):
-                        return True
-            else:
-                # list vs non-list
-                if do_op(sub_source, EQUAL, value):
-                    return True
-        return False           
-    else:
-        if detect_list(value):
-            # non-list vs list
-            for sub_val in value:
-                if do_op(source, EQUAL, sub_val):
-                    return True
-                return False
+class ValueSet(object):
+    ''' the values looked for by contains, hashed so that an item is tested
+    against all of them with about one dictionary lookup. An item matches a
+    value when do_op(item, EQUAL, value) would be True; the str() fallback of
+    EQUAL is kept by also hashing the str() of each value. Values that can not
+    be hashed (and items that can not) are compared one at a time.
+    '''
+
+    def __init__(self, values):
+        self.values = list(values)
+        self.none = []      # positions of the None values
+        self.exact = {}     # value: positions of the values equal to it
+        self.strings = {}   # str(value): [(type of value, position), ...]
+        self.slow = []      # (position, comparator) of the unhashable values
+        types = set()
+        for (position, value) in enumerate(self.values):
+            if value is None:
+                self.none.append(position)
+                continue
+            try:
+                hash(value)
+                hashable = (value == value)  # a NaN is never equal
+            except Exception:
+                hashable = False
+            if not hashable:
+                self.slow.append((position, make_comparator(EQUAL, value)))
+                continue
+            self.exact.setdefault(value, []).append(position)
+            (str_ok, str_value) = _str_of(value)
+            if str_ok:
+                self.strings.setdefault(str_value, []).append((type(value), position))
+            types.add(type(value))
+        # when every value is of one type, an item of that type never needs
+        # the str() fallback
+        if len(types)==1:
+            self.only_type = types.pop()
         else:
-            # non-list vs non-list, that is a simple comparison:
-            return do_op(source, EQUAL, value)
-    return False
+            self.only_type = None
+        self.compares = None
+
+    def __len__(self):
+        return len(self.values)
+
+    def comparators(self):
+        ''' a comparator (see make_comparator) for each value, in order '''
+        if self.compares is None:
+            self.compares = [make_comparator(EQUAL, value) for value in self.values]
+        return self.compares
+
+    def _compare_each(self, item):
+        return [position for (position, compare) in enumerate(self.comparators()) if compare(item)]
+
+    def _string_matches(self, item):
+        item_type = type(item)
+        if not self.strings or item_type is self.only_type:
+            return []
+        count_slow_path("str_compare")
+        try:
+            str_item = str(item)
+        except:
+            return []
+        return [position for (value_type, position) in self.strings.get(str_item, ()) if value_type is not item_type]
+
+    def matches(self, item):
+        ''' True if the item is EQUAL to any of the values '''
+        if item is None:
+            return bool(self.none)
+        try:
+            if item in self.exact:
+                return True
+        except TypeError:
+            return bool(self._compare_each(item))
+        for (position, compare) in self.slow:
+            if compare(item):
+                return True
+        if self.strings and type(item) is not self.only_type:
+            return bool(self._string_matches(item))
+        return False
+
+    def positions(self, item):
+        ''' the positions of every value the item is EQUAL to '''
+        if item is None:
+            return self.none
+        try:
+            found = self.exact.get(item, ())
+        except TypeError:
+            return self._compare_each(item)
+        if self.slow or (self.strings and type(item) is not self.only_type):
+            found = list(found)
+            found.extend(position for (position, compare) in self.slow if compare(item))
+            found.extend(self._string_matches(item))
+        return found
+
+# with findAll, a source list up to this long is searched for each value in
+# turn rather than through the hashed positions
+SHORT_SOURCE = 8
 
-def list_match_all(source, value):
-    success = True
+def make_list_matcher(value, findAll=False):
+    ''' returns a function 'match(source)' telling whether the source (or,
+    if it is a list, any of its entries) is EQUAL to the value or to any entry
+    of it. If findAll is set, every entry of the value must be found instead.
+    The value (or each entry of it) is hashed once, in a ValueSet, so the cost
+    for each source is about one lookup per entry of the source.
+    '''
     if detect_list(value):
-        for sub_val in value:
-            if detect_list(source):
-                # list vs list
-                entry_found = False
-                for sub_source in source:
-                    if do_op(sub_source, EQUAL, sub_val):
-                        entry_found = True
-                if not entry_found:
-                    success = False
-            else:
-                # non-list vs list
-                if not do_op(source, EQUAL, sub_val):
-                    success = False
+        value_set = ValueSet(value)
     else:
+        value_set = ValueSet([value])
+    if findAll:
+        wanted = len(value_set)
+        positions = value_set.positions
+        compares = value_set.comparators()
+        def match(source):
+            if not detect_list(source):
+                source = [source]
+            try:
+                short = len(source)<=SHORT_SOURCE
+            except TypeError:
+                short = False
+            if short:
+                # most sources fail on the first value or two; looking for
+                # each value in turn stops there
+                for compare in compares:
+                    for sub_source in source:
+                        if compare(sub_source):
+                            break
+                    else:
+                        return False
+                return True
+            found = set()
+            for sub_source in source:
+                found.update(positions(sub_source))
+                if len(found)==wanted:
+                    return True
+            return len(found)==wanted
+        return match
+    matches = value_set.matches
+    def match(source):
         if detect_list(source):
-            # list vs non-list
-            success = False
             for sub_source in source:
-                if do_op(sub_source, EQUAL, value):
-                    success = True
-        else:
-            # non-list vs non-list, that is a simple comparison:
-            success = do_op(source, EQUAL, value)
-    return success
+                if matches(sub_source):
+                    return True
+            return False
+        return matches(source)
+    return match
 
 def csv_quote(quote_char, s):
-    result = quote_char
-    for c in s:
-        result += c
-        if c==quote_char:
-            result += c
-    result += quote_char
-    return result
+    if len(quote_char)==1:
+        s = s.replace(quote_char, quote_char+quote_char)
+    return quote_char + s + quote_char
+
+def csv_keys(table):
+    ''' returns every key found in the table, in the order first seen '''
+    attr_list = []
+    seen = set()
+    for row in table:
+        for key in convert_to_dict(row):
+            if not key in seen:
+                seen.add(key)
+                attr_list.append(key)
+    return attr_list
+
+def csv_header(attr_list, quote_char, eol_chars):
+    if quote_char:
+        temp = quote_char+","+quote_char
+        return quote_char + temp.join(attr_list) + quote_char + eol_chars
+    return ",".join(attr_list) + eol_chars
+
+def csv_line(row, attr_list, quote_char, eol_chars):
+    ''' returns one line of CSV for the row. See PLOD.returnCSV for the rules. '''
+    row = convert_to_dict(row)
+    last = len(attr_list) - 1
+    ml = []
+    for ctr, key in enumerate(attr_list):
+        if key in row:
+            if row[key] is None:
+                value = ""
+            else:
+                value = str(row[key])
+            if quote_char:
+                ml.append(csv_quote(quote_char, value))
+            else:
+                if ('"' in value) or (',' in value):
+                    ml.append(csv_quote('"', value))
+                else:
+                    if (ctr==last) and (len(value)==0):
+                        ml.append('""')
+                    else:
+                        ml.append(value)
+        else:
+            if quote_char:
+                ml.append(quote_char+quote_char)
+            else:
+                if ctr==last:
+                    ml.append('""')
+                else:
+                    ml.append("")
+    return ",".join(ml) + eol_chars
     
+def string_lines(rows, indent, executable, honorMissing):
+    ''' yields the lines of PLOD.returnString for a page of rows that have
+    already been converted to dictionaries. Each value goes through repr()
+    once; the keys, value strings and widths are gathered in one pass.
+    '''
+    attr_width = {}
+    present = {}
+    reprs = []
+    for row in rows:
+        row_reprs = {}
+        for key in row:
+            s = repr(row[key])
+            row_reprs[key] = s
+            if len(s) > attr_width.get(key, 0):
+                attr_width[key] = len(s)
+            else:
+                attr_width.setdefault(key, 0)
+            present[key] = present.get(key, 0) + 1
+        reprs.append(row_reprs)
+    if not honorMissing:
+        for key in attr_width:
+            if present[key] < len(rows) and attr_width[key] < len("None"):
+                attr_width[key] = len("None")
+    # get a sorted list of keys
+    attr_order = attr_width.keys()
+    attr_order.sort()
+    labels = {}
+    blanks = {}
+    for key in attr_order:
+        if executable:
+            labels[key] = "'"+str(key) + "': "
+            blanks[key] = " "*len(str(key)) + "    "
+        else:
+            labels[key] = str(key) + ": "
+            blanks[key] = " "*len(str(key)) + "  "
+    for (row, row_reprs) in zip(rows, reprs):
+        middle = []
+        for key in attr_order:
+            if key in row_reprs:
+                s = row_reprs[key]
+                if type(row[key]) is typemod.IntType:
+                    s = s.rjust(attr_width[key])
+                item = labels[key]
+            else:
+                if honorMissing:
+                    item = blanks[key]
+                    s = ""
+                else:
+                    item = labels[key]
+                    s = "None"
+            middle.append(item + s.ljust(attr_width[key]))
+        if indent:
+            yield "    {" + special_join(middle) + "}"
+        else:
+            yield "{" + special_join(middle) + "}"
+
 def special_join(alist):
     if len(alist)==0:
         return ""
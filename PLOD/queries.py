@@ -0,0 +1,224 @@
+# PLOD\queries.py
+#
+# Pythonic List of Dictionary module/class (PLOD)
+#
+# QUERY DOCUMENT SUPPORT ROUTINES
+#
+# A MongoDB-style query document given to PLOD.find is compiled once into a
+# predicate: a function of one row returning True or False. The most recent
+# predicates are cached (see internal.cache_compiled). Each operator
+# maps onto the test used by the matching PLOD filter:
+#
+#    {"key": value}              eq
+#    {"key": {"$eq": value}}     eq
+#    {"key": {"$ne": value}}     ne, with includeMissing (as MongoDB does)
+#    {"key": {"$gt": value}}     gt      (also $gte, $lt and $lte)
+#    {"key": {"$in": [...]}}     the value (or any entry of it) equals one listed;
+#                                a None in the list also matches a missing key
+#    {"key": {"$nin": [...]}}    the opposite of $in
+#    {"key": {"$all": [...]}}    contains, with findAll
+#    {"key": {"$exists": True}}  hasKey  ({"$exists": False} is missingKey)
+#    {"key": {"$size": n}}       the value is a list of n entries
+#    {"key": {"$regex": "..."}}  re.search on the str() of the value (with
+#                                the "i", "m", "s" and "x" of "$options")
+#    {"key": {"$not": {...}}}    the opposite of the operators given
+#    {"$and": [...]}, {"$or": [...]}, {"$nor": [...]}
+#
+# A key may use dots to reach into subtending dictionaries, as in MongoDB.
+# Every operator of a document (or of a key) must match.
+#
+# query_conditions splits off the operators that are plain PLOD filter
+# conditions (so that an index or the columns can answer them); the rest of
+# the document becomes one "find" condition.
+#
+
+import re
+import internal
+
+_compiled = {}
+
+def freeze(item):
+    ''' a hashable copy of a query document, used to cache its predicate.
+    Each value is kept with its type: 1, 1.0 and True hash alike but, through
+    the str() fallback of EQUAL, do not match the same rows.
+    '''
+    if isinstance(item, dict):
+        return ("dict", tuple(sorted((freeze(key), freeze(value)) for (key, value) in item.items())))
+    if isinstance(item, (list, tuple)):
+        return (type(item).__name__, tuple(freeze(value) for value in item))
+    hash(item)
+    return (type(item), item)
+
+def compile_query(document):
+    ''' returns the predicate for a query document; raises ValueError if the
+    document can not be understood.
+    '''
+    try:
+        frozen = freeze(document)
+        return _compiled[frozen]
+    except TypeError:
+        frozen = None
+    except KeyError:
+        pass
+    predicate = compile_document(document)
+    if frozen is not None:
+        internal.cache_compiled(_compiled, frozen, predicate)
+    return predicate
+
+def all_of(tests):
+    if len(tests)==1:
+        return tests[0]
+    def test(row):
+        for one_test in tests:
+            if not one_test(row):
+                return False
+        return True
+    return test
+
+def any_of(tests):
+    def test(row):
+        for one_test in tests:
+            if one_test(row):
+                return True
+        return False
+    return test
+
+def compile_document(document):
+    if not isinstance(document, dict):
+        raise ValueError("a query document must be a dictionary, not {}".format(repr(document)))
+    tests = []
+    for (key, spec) in document.items():
+        if key in ("$and", "$or", "$nor"):
+            if not isinstance(spec, (list, tuple)) or not spec:
+                raise ValueError("{} needs a non-empty list of query documents".format(key))
+            sub_tests = [compile_document(sub_document) for sub_document in spec]
+            if key=="$and":
+                tests.append(all_of(sub_tests))
+            elif key=="$or":
+                tests.append(any_of(sub_tests))
+            else:
+                either = any_of(sub_tests)
+                tests.append(lambda row, either=either: not either(row))
+        elif isinstance(key, basestring) and key.startswith("$"):
+            raise ValueError("unknown query operator {}".format(key))
+        else:
+            tests.append(compile_field(key, spec))
+    if not tests:
+        return lambda row: True
+    return all_of(tests)
+
+def is_operator_spec(spec):
+    return isinstance(spec, dict) and spec and all(isinstance(key, basestring) and key.startswith("$") for key in spec)
+
+def compile_field(key, spec):
+    if not is_operator_spec(spec):
+        return internal.select_test(key, internal.EQUAL, spec, False)
+    options = spec.get("$options", "")
+    tests = [compile_operator(key, op, value, options) for (op, value) in spec.items() if op!="$options"]
+    if not tests:
+        raise ValueError("$options needs a $regex")
+    return all_of(tests)
+
+SELECT_OPS = {
+    "$eq":  (internal.EQUAL, False),
+    "$ne":  (internal.NOT_EQUAL, True),
+    "$gt":  (internal.GREATER, False),
+    "$gte": (internal.GREATERorEQUAL, False),
+    "$lt":  (internal.LESS, False),
+    "$lte": (internal.LESSorEQUAL, False),
+}
+
+REGEX_FLAGS = {"i": re.IGNORECASE, "m": re.MULTILINE, "s": re.DOTALL, "x": re.VERBOSE}
+
+def compile_operator(key, op, value, options=""):
+    if op in SELECT_OPS:
+        (select_op, includeMissing) = SELECT_OPS[op]
+        return internal.select_test(key, select_op, value, includeMissing)
+    if op in ("$in", "$nin"):
+        if not isinstance(value, (list, tuple, set)):
+            raise ValueError("{} needs a list of values".format(op))
+        values = list(value)
+        missing = None in values
+        contained = internal.make_list_matcher(values)
+        crawl = internal.compile_key(key)
+        def test(row):
+            (target, tkey, field) = crawl(row)
+            if target is None:
+                return missing
+            return contained(field)
+        if op=="$in":
+            return test
+        return lambda row: not test(row)
+    if op=="$all":
+        if not isinstance(value, (list, tuple)):
+            raise ValueError("$all needs a list of values")
+        return internal.contains_test(key, value, True, False, False)
+    if op=="$exists":
+        if value:
+            return internal.has_key_test(key, False)
+        return internal.missing_key_test(key, False)
+    if op=="$size":
+        crawl = internal.compile_key(key)
+        def test(row):
+            (target, tkey, field) = crawl(row)
+            return target is not None and type(field) in (list, tuple) and len(field)==value
+        return test
+    if op=="$regex":
+        flags = 0
+        for option in options:
+            if not option in REGEX_FLAGS:
+                raise ValueError("unknown $options flag {}".format(repr(option)))
+            flags |= REGEX_FLAGS[option]
+        pattern = re.compile(value, flags)
+        crawl = internal.compile_key(key)
+        def test(row):
+            (target, tkey, field) = crawl(row)
+            if target is None or field is None:
+                return False
+            return pattern.search(field if isinstance(field, basestring) else str(field)) is not None
+        return test
+    if op=="$not":
+        if not is_operator_spec(value):
+            raise ValueError("$not needs a document of operators")
+        inner = compile_field(key, value)
+        return lambda row: not inner(row)
+    raise ValueError("unknown query operator {}".format(op))
+
+def query_conditions(document):
+    ''' returns the filter conditions (see internal.compile_condition) that
+    together match the same rows as the query document. Raises ValueError if
+    the document can not be understood.
+    '''
+    compile_query(document)
+    conditions = []
+    rest = {}
+    for (key, spec) in document.items():
+        if isinstance(key, basestring) and key.startswith("$"):
+            rest[key] = spec
+            continue
+        if not is_operator_spec(spec):
+            conditions.append(("select", (key, internal.EQUAL, spec, False)))
+            continue
+        other = {}
+        for (op, value) in spec.items():
+            if op in SELECT_OPS:
+                (select_op, includeMissing) = SELECT_OPS[op]
+                conditions.append(("select", (key, select_op, value, includeMissing)))
+            elif op=="$exists":
+                if value:
+                    conditions.append(("has_key", (key, False)))
+                else:
+                    conditions.append(("missing_key", (key, False)))
+            elif op=="$all":
+                conditions.append(("contains", (key, value, True, False, False)))
+            elif op=="$in":
+                conditions.append(("contains", (key, list(value), False, False, None in value)))
+            elif op=="$nin":
+                conditions.append(("contains", (key, list(value), False, True, not None in value)))
+            else:
+                other[op] = value
+        if other:
+            rest[key] = other
+    if rest:
+        conditions.append(("find", (rest,)))
+    return conditions
@@ -0,0 +1,364 @@
+# benchmarks\bench_plod.py
+#
+# Pythonic List of Dictionary module/class (PLOD)
+#
+# BENCHMARK SUITE
+#
+# Times every PLOD operation at several list sizes and over several kinds of
+# rows, and saves the results as JSON. Run it from any directory; it always
+# benchmarks the PLOD package found next to this folder, so checking out
+# another version and running it again gives comparable numbers:
+#
+#    python benchmarks/bench_plod.py --label 0.1.7 --output old.json
+#    python benchmarks/bench_plod.py --label work --output new.json --compare old.json
+#
+# Use --sizes, --row-types and --ops to narrow a run; the full default run
+# (up to 1,000,000 rows) takes a long time.
+#
+
+import os
+import sys
+import json
+import time
+import random
+import platform
+import argparse
+import datetime
+from collections import namedtuple
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PLOD import PLOD
+
+DEFAULT_SIZES = [1000, 10000, 100000, 1000000]
+
+NAMES = ["Jim", "Larry", "Joe", "Bill", "Jan", "Simon", "Ann", "Zoe"]
+TAGS = ["red", "green", "blue", "gold", "grey"]
+
+#############################
+# row types
+#############################
+
+class Person(object):
+    def __init__(self, **kwargs):
+        self.__dict__.update(kwargs)
+
+class SlotPerson(object):
+    __slots__ = ("id", "name", "age", "tags", "income")
+    def __init__(self, **kwargs):
+        for (key, value) in kwargs.items():
+            setattr(self, key, value)
+
+TuplePerson = namedtuple("TuplePerson", ["id", "name", "age", "tags", "income"])
+
+def make_fields(rng, i):
+    ''' the fields of one row; 'income' is missing from a fifth of them '''
+    fields = {
+        "id": i,
+        "name": rng.choice(NAMES),
+        "age": rng.randint(18, 80),
+        "tags": rng.sample(TAGS, rng.randint(0, 3)),
+    }
+    if rng.random() < 0.8:
+        fields["income"] = rng.randint(10000, 150000)
+    return fields
+
+def dict_row(fields):
+    return fields
+
+def object_row(fields):
+    return Person(**fields)
+
+def slots_row(fields):
+    return SlotPerson(**fields)
+
+def namedtuple_row(fields):
+    # a namedtuple has every field; a missing income is None
+    return TuplePerson(fields["id"], fields["name"], fields["age"], fields["tags"], fields.get("income"))
+
+def nested_row(fields):
+    person = {"name": fields["name"], "age": fields["age"]}
+    if "income" in fields:
+        person["job"] = {"income": fields["income"]}
+    return {"id": fields["id"], "person": person, "tags": fields["tags"]}
+
+def list_row(fields):
+    fields["scores"] = [fields["age"] % 7, fields["age"] % 5, fields["id"] % 11]
+    return fields
+
+# each row type names the key used for each logical field
+ROW_TYPES = {
+    "dict": (dict_row, {
+        "id": "id", "name": "name", "age": "age", "income": "income", "list": "tags",
+    }),
+    "object": (object_row, {
+        "id": "id", "name": "name", "age": "age", "income": "income", "list": "tags",
+    }),
+    "slots": (slots_row, {
+        "id": "id", "name": "name", "age": "age", "income": "income", "list": "tags",
+    }),
+    "namedtuple": (namedtuple_row, {
+        "id": "id", "name": "name", "age": "age", "income": "income", "list": "tags",
+    }),
+    "nested": (nested_row, {
+        "id": "id", "name": ["person", "name"], "age": ["person", "age"],
+        "income": ["person", "job", "income"], "list": "tags",
+    }),
+    "list": (list_row, {
+        "id": "id", "name": "name", "age": "age", "income": "income", "list": "scores",
+    }),
+}
+
+def make_rows(row_type, size, seed=1):
+    rng = random.Random(seed)
+    maker = ROW_TYPES[row_type][0]
+    return [maker(make_fields(rng, i)) for i in xrange(size)]
+
+#############################
+# operations
+#############################
+
+# each operation is (name, function(rows, keys, size)); the function does the
+# timed work and returns the number of entries in the result. A function with
+# a 'setup(rows, keys)' attribute is given what setup returns in place of the
+# rows; setup runs before each repeat and is not timed.
+
+def op_construction(rows, keys, size):
+    return PLOD(rows).count()
+
+def filter_op(method, key_name, value, **kwargs):
+    def op(rows, keys, size):
+        return getattr(PLOD(rows), method)(keys[key_name], value, **kwargs).count()
+    return op
+
+def op_hasKey(rows, keys, size):
+    return PLOD(rows).hasKey(keys["income"]).count()
+
+def op_missingKey(rows, keys, size):
+    return PLOD(rows).missingKey(keys["income"]).count()
+
+def op_contains(rows, keys, size):
+    if keys["list"]=="scores":
+        value = [3, 4]
+    else:
+        value = ["red", "gold"]
+    return PLOD(rows).contains(keys["list"], value).count()
+
+def op_contains_all(rows, keys, size):
+    if keys["list"]=="scores":
+        value = [1, 2]
+    else:
+        value = ["red", "gold"]
+    return PLOD(rows).contains(keys["list"], value, findAll=True).count()
+
+def op_filter_chain(rows, keys, size):
+    return PLOD(rows).gte(keys["age"], 30).lt(keys["age"], 60).hasKey(keys["income"]).ne(keys["name"], "Jim").count()
+
+def op_sort(rows, keys, size):
+    return PLOD(rows).sort(keys["income"]).count()
+
+def op_sort_multi(rows, keys, size):
+    return PLOD(rows).sort([keys["name"], keys["age"]], reverse=True).count()
+
+def op_renumber(rows, keys, size):
+    return PLOD(rows).renumber("rank", insert=True).count()
+
+def op_upsert(rows, keys, size):
+    my_plod = PLOD(rows)
+    for i in xrange(0, size, max(1, size // 100)):
+        my_plod.upsert(keys["id"], i, {"id": i, "name": "Replaced"})
+    return my_plod.count()
+
+def op_insert(rows, keys, size):
+    my_plod = PLOD(rows)
+    for i in xrange(100):
+        my_plod.insert({"id": size + i, "name": "Added"})
+    return my_plod.count()
+
+def op_deleteByOrigIndex(rows, keys, size):
+    my_plod = PLOD(rows)
+    for i in xrange(0, size, max(1, size // 100)):
+        my_plod.deleteByOrigIndex(i)
+    return my_plod.count()
+
+def op_deleteByOrigIndexList(rows, keys, size):
+    return PLOD(rows).deleteByOrigIndexList(range(0, size, 3)).count()
+
+def op_returnList(rows, keys, size):
+    return len(PLOD(rows).gt(keys["age"], 40).returnList())
+
+def op_returnLOD(rows, keys, size):
+    return len(PLOD(rows).returnLOD())
+
+def op_returnString(rows, keys, size):
+    return len(PLOD(rows).returnString())
+
+def op_returnCSV(rows, keys, size):
+    return len(PLOD(rows).returnCSV(keys=["id", "name", "age", "income"]))
+
+# the same filters and sort on a PLOD already switched to columns (see
+# PLOD.toColumnar), to compare with the row by row runs above
+
+def setup_columnar(rows, keys):
+    return PLOD(rows).toColumnar()
+
+def columnar_op(method, key_name, value):
+    def op(my_plod, keys, size):
+        return getattr(my_plod, method)(keys[key_name], value).count()
+    op.setup = setup_columnar
+    return op
+
+def op_filter_chain_columnar(my_plod, keys, size):
+    return my_plod.gte(keys["age"], 30).lt(keys["age"], 60).hasKey(keys["income"]).ne(keys["name"], "Jim").count()
+op_filter_chain_columnar.setup = setup_columnar
+
+def op_sort_columnar(my_plod, keys, size):
+    return my_plod.sort(keys["income"]).count()
+op_sort_columnar.setup = setup_columnar
+
+OPERATIONS = [
+    ("construction", op_construction),
+    ("eq", filter_op("eq", "name", "Jim")),
+    ("ne", filter_op("ne", "name", "Jim")),
+    ("gt", filter_op("gt", "age", 40)),
+    ("gte", filter_op("gte", "age", 40)),
+    ("lt", filter_op("lt", "income", 50000)),
+    ("lte", filter_op("lte", "income", 50000, includeMissing=True)),
+    ("hasKey", op_hasKey),
+    ("missingKey", op_missingKey),
+    ("contains", op_contains),
+    ("contains_all", op_contains_all),
+    ("filter_chain", op_filter_chain),
+    ("sort", op_sort),
+    ("sort_multi", op_sort_multi),
+    ("renumber", op_renumber),
+    ("upsert", op_upsert),
+    ("insert", op_insert),
+    ("deleteByOrigIndex", op_deleteByOrigIndex),
+    ("deleteByOrigIndexList", op_deleteByOrigIndexList),
+    ("returnList", op_returnList),
+    ("returnLOD", op_returnLOD),
+    ("returnString", op_returnString),
+    ("returnCSV", op_returnCSV),
+    ("eq_columnar", columnar_op("eq", "name", "Jim")),
+    ("gt_columnar", columnar_op("gt", "age", 40)),
+    ("filter_chain_columnar", op_filter_chain_columnar),
+    ("sort_columnar", op_sort_columnar),
+]
+
+# these change the rows, so each repeat is given a fresh copy
+MUTATING = set(["renumber", "upsert", "insert"])
+
+#############################
+# running
+#############################
+
+def time_op(name, function, row_type, size, repeat):
+    ''' returns the list of times taken and the count of entries returned '''
+    keys = ROW_TYPES[row_type][1]
+    rows = make_rows(row_type, size)
+    times = []
+    count = None
+    for attempt in xrange(repeat):
+        if attempt and name in MUTATING:
+            rows = make_rows(row_type, size)
+        setup = getattr(function, "setup", None)
+        if setup is None:
+            given = rows
+        else:
+            given = setup(rows, keys)
+        start = time.time()
+        count = function(given, keys, size)
+        times.append(time.time() - start)
+    return (times, count)
+
+def run(sizes, row_types, ops, repeat, log=sys.stderr):
+    results = []
+    for size in sizes:
+        for row_type in row_types:
+            for (name, function) in OPERATIONS:
+                if ops and not name in ops:
+                    continue
+                result = {
+                    "size": size,
+                    "row_type": row_type,
+                    "operation": name,
+                }
+                try:
+                    (times, count) = time_op(name, function, row_type, size, repeat)
+                except Exception as error:
+                    # an operation this row type does not support
+                    result["error"] = "{}: {}".format(type(error).__name__, error)
+                    log.write("{:>8} {:<7} {:<22} {}\n".format(size, row_type, name, result["error"]))
+                else:
+                    result["best"] = min(times)
+                    result["mean"] = sum(times) / len(times)
+                    result["rows_out"] = count
+                    log.write("{:>8} {:<7} {:<22} {:10.4f}s\n".format(size, row_type, name, result["best"]))
+                results.append(result)
+                log.flush()
+    return results
+
+def compare(results, baseline, out=sys.stdout):
+    ''' print the ratio of each best time to the best time in the baseline '''
+    old = {}
+    for result in baseline["results"]:
+        if "best" in result:
+            old[(result["size"], result["row_type"], result["operation"])] = result["best"]
+    out.write("{:>8} {:<7} {:<22} {:>10} {:>10} {:>7}\n".format("size", "rows", "operation", "baseline", "now", "ratio"))
+    for result in results:
+        before = old.get((result["size"], result["row_type"], result["operation"]))
+        if before is None or not "best" in result:
+            continue
+        if before:
+            ratio = "{:7.2f}".format(result["best"] / before)
+        else:
+            ratio = "      -"
+        out.write("{:>8} {:<7} {:<22} {:10.4f} {:10.4f} {}\n".format(result["size"], result["row_type"], result["operation"], before, result["best"], ratio))
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Time PLOD operations and save the results as JSON.")
+    parser.add_argument("--sizes", default=",".join(str(size) for size in DEFAULT_SIZES),
+                        help="comma-separated list sizes (default: %(default)s)")
+    parser.add_argument("--row-types", default=",".join(sorted(ROW_TYPES)),
+                        help="comma-separated row types (default: %(default)s)")
+    parser.add_argument("--ops", default="",
+                        help="comma-separated operations to run (default: all of " + ", ".join(name for (name, function) in OPERATIONS) + ")")
+    parser.add_argument("--repeat", type=int, default=3,
+                        help="runs of each operation; the best is reported (default: %(default)s)")
+    parser.add_argument("--label", default="",
+                        help="a name for this run, such as a version number")
+    parser.add_argument("--output", default="bench_results.json",
+                        help="the JSON file to write (default: %(default)s)")
+    parser.add_argument("--compare", default=None,
+                        help="a JSON file from an earlier run to compare against")
+    args = parser.parse_args(argv)
+
+    sizes = [int(float(size)) for size in args.sizes.split(",") if size]
+    row_types = [row_type for row_type in args.row_types.split(",") if row_type]
+    for row_type in row_types:
+        if not row_type in ROW_TYPES:
+            parser.error("unknown row type: {}".format(row_type))
+    ops = set(op for op in args.ops.split(",") if op)
+    unknown = ops - set(name for (name, function) in OPERATIONS)
+    if unknown:
+        parser.error("unknown operation: {}".format(", ".join(sorted(unknown))))
+
+    results = run(sizes, row_types, ops, args.repeat)
+    report = {
+        "label": args.label,
+        "created": datetime.datetime.now().isoformat(),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "repeat": args.repeat,
+        "results": results,
+    }
+    with open(args.output, "w") as output:
+        json.dump(report, output, indent=2, sort_keys=True)
+    if args.compare:
+        with open(args.compare) as baseline:
+            compare(results, json.load(baseline))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())